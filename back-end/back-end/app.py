@@ -1,19 +1,37 @@
 import datetime
+import json
 import logging as rel_log
 import os
-import shutil
+import zipfile
 from datetime import timedelta
 from flask import *
+from werkzeug.exceptions import NotFound
 from models.user import User
 from utils.auth import generate_token, token_required
 from models.record import Record
+from models.db import get_pool
+from models.migrations import migrate, current_version
+from models.record_writer import RecordWriter
 import cv2
-from processor.yolov8_detector import YOLOv8Detector
-from processor.yolov11_detector import YOLOv11Detector
+import numpy as np
+from utils.storage import background_writer
+from utils.content_store import ContentStore, is_content_name
+from utils.renditions import rendition_writer, thumbnail_url, rendition_urls
+from utils.timing import timed, add_timing, server_timing, observe_request, metrics
+from processor.model_registry import ModelRegistry
+from processor.sam_cache import get_sam_holder
+from processor.warmup import DetectorWarmup
+from processor.batch_scheduler import InferenceScheduler
+from processor.jobs import JobManager, JobQueueFull
+from processor.pipeline import StagedPipeline
+from config import SAM_CONFIG, MODEL_VERSIONS, MODEL_REGISTRY_CONFIG, WARMUP_CONFIG, SCHEDULER_CONFIG, JOB_CONFIG, \
+    BULK_CONFIG, STORAGE_CONFIG, WRITE_BEHIND_CONFIG
 import time
 UPLOAD_FOLDER = r'./uploads'
 
 ALLOWED_EXTENSIONS = set(['png', 'jpg', 'jpeg'])
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HISTORY_MAX_PER_PAGE = 100
 app = Flask(__name__)
 app.secret_key = 'secret!'
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -27,9 +45,72 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = timedelta(seconds=1)
 # 初始化缺陷检测器
 # defect_detector = YOLOv8Detector('dataset/runs/detect/neu_defect_yolov84/weights/best.pt')
 # defect_detector = YOLOv11Detector('dataset/runs/detect/best.pt')
-yolov8_detector = YOLOv8Detector('dataset/runs/detect/neu_defect_yolov84/weights/best.pt')
-# yolov11_detector = YOLOv11Detector('dataset/runs/detect/best.pt')
-yolov11_detector = YOLOv11Detector('weights/best.pt')
+# yolov8_detector = YOLOv8Detector('dataset/runs/detect/neu_defect_yolov84/weights/best.pt')
+# yolov11_detector = YOLOv11Detector('weights/best.pt')
+# 模型注册表: 按版本名在首次使用时加载, 版本在 config.MODEL_VERSIONS 中配置
+detectors = ModelRegistry(
+    MODEL_VERSIONS,
+    default_version=MODEL_REGISTRY_CONFIG.get('default_version', 'YOLOv11'),
+    memory_budget_mb=MODEL_REGISTRY_CONFIG.get('memory_budget_mb', 0)
+)
+preload_versions = [v for v in MODEL_REGISTRY_CONFIG.get('preload', []) if v in detectors]
+
+# 微批处理调度器: 每个模型版本一个推理线程, 只执行前向传播
+scheduler = None
+if SCHEDULER_CONFIG.get('enabled'):
+    scheduler = InferenceScheduler(
+        detectors,
+        max_batch_size=SCHEDULER_CONFIG.get('max_batch_size', 4),
+        max_wait_ms=SCHEDULER_CONFIG.get('max_wait_ms', 10),
+        max_queue_depth=SCHEDULER_CONFIG.get('max_queue_depth', 32)
+    )
+
+# 数据库结构迁移只在启动时执行一次, 之后每个操作从连接池借用连接
+try:
+    migrate()
+except Exception as e:
+    print(f"Schema migration error: {str(e)}")
+
+# 检测记录后台批量写入: 启用后 /upload 不再等待单条 INSERT 和提交
+record_writer = None
+if WRITE_BEHIND_CONFIG.get('enabled'):
+    record_writer = RecordWriter(
+        max_batch=WRITE_BEHIND_CONFIG.get('max_batch', 200),
+        flush_interval=WRITE_BEHIND_CONFIG.get('flush_interval', 0.5),
+        max_pending=WRITE_BEHIND_CONFIG.get('max_pending', 10000)
+    )
+
+# 内容寻址存储: 原图和标注图按 SHA-256 命名, 定期清理不再被检测记录引用的文件
+content_store = ContentStore(background_writer, upload_dir=UPLOAD_FOLDER)
+
+# 后台检测任务线程池, /upload 和 /api/jobs 共用
+job_manager = JobManager(
+    max_workers=JOB_CONFIG.get('max_workers', 4),
+    max_pending=JOB_CONFIG.get('max_pending', 64),
+    retention=JOB_CONFIG.get('retention', 3600)
+)
+
+# 启动预热: 后台线程中用合成图像跑一遍各检测器, /api/ready 报告是否完成
+warmup = DetectorWarmup(runs=WARMUP_CONFIG.get('runs', 3), frame_shape=WARMUP_CONFIG.get('frame_shape', (1080, 1920, 3)))
+if WARMUP_CONFIG.get('enabled'):
+    warmup.start(detectors, get_sam_holder() if SAM_CONFIG.get('preload') else None, preload_versions)
+else:
+    if SAM_CONFIG.get('preload'):
+        get_sam_holder().load()
+    for version in preload_versions:
+        detectors.get(version)
+    warmup.ready = True
+
+# 清理线程在处理第一个请求时启动而不是在导入时: serve.py 的父进程在 fork 之前不能有后台线程,
+# pre-fork 时每个工作进程各启动一个, 由 ContentStore 协调为每个间隔只清理一次
+@app.before_request
+def start_storage_gc():
+    if STORAGE_CONFIG.get('gc_enabled'):
+        content_store.start_gc(lambda: Record().referenced_files(),
+                               interval=STORAGE_CONFIG.get('gc_interval', 3600),
+                               min_age=STORAGE_CONFIG.get('gc_min_age', 3600))
+
+
 # 添加header解决跨域
 @app.after_request
 def after_request(response):
@@ -37,6 +118,8 @@ def after_request(response):
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     response.headers['Access-Control-Allow-Methods'] = 'POST, GET, OPTIONS'
     response.headers['Access-Control-Allow-Headers'] = 'Content-Type, X-Requested-With, Authorization'
+    # 允许前端 (不同端口) 读取 Server-Timing
+    response.headers['Timing-Allow-Origin'] = '*'
     return response
 
 
@@ -164,70 +247,334 @@ def login():
 #             return jsonify({'status': 0, 'message': 'Defect detection failed'})
 #
 #     return jsonify({'status': 0, 'message': 'Invalid file'})
-@app.route('/upload', methods=['GET', 'POST'])
-@token_required
-def upload_file(current_user_id):
-    file = request.files['file']
+def record_detection(current_user_id, original_name, draw_name, detections, detect_stats, model_version,
+                     record_model=None, durable=True):
+    """
+    写入检测记录并构建响应数据（标注图已保存到 tmp/draw）
+    Args:
+        original_name: 内容寻址的原图文件名
+        draw_name: 内容寻址的标注图文件名
+        durable: 启用后台批量写入时是否等待记录提交到数据库
+    Returns:
+        (与 /upload 相同的响应数据, Future 或 None), Future 在后台写入的记录提交后完成
+    """
+    # 文件名即内容哈希, 内容不变时浏览器直接使用缓存, 内容变化时 URL 随之变化
+    original_url = f'http://127.0.0.1:5003/tmp/ct/{original_name}'
+    detected_url = f'http://127.0.0.1:5003/tmp/draw/{draw_name}'
+
+    total_defects = len(detections)
+    defect_types = list(set(d['class'] for d in detections))
+
+    record = (
+        current_user_id,
+        original_url,
+        detected_url,
+        detections,
+        total_defects,
+        defect_types,
+        datetime.datetime.now(),
+        model_version
+    )
+    written = None
+    with timed(detect_stats, 'db'):
+        if record_writer is not None:
+            written = record_writer.submit(record)
+            if durable:
+                written.result()
+        else:
+            record_model = record_model or Record()
+            record_model.insert_record(*record)
+
+    return {
+        'status': 1,
+        'image_url': original_url,
+        'draw_url': detected_url,
+        'thumbnail_url': thumbnail_url(detected_url),
+        'renditions': rendition_urls(detected_url),
+        'defect_detection': {
+            'detections': detections,
+            'total_defects': total_defects,
+            'defect_types': defect_types,
+            # 分块数量仍放在原来的 tiles 字段中（stats 中也有）, 已有客户端不受影响
+            'tiles': {key: detect_stats[key] for key in ('tiles_total', 'tiles_skipped') if key in detect_stats},
+            'stats': detect_stats
+        }
+    }, written
+
+
+def detect_and_record(current_user_id, filename, original_name, img, model_version, detect_stats=None,
+                      received_at=None, durable=True):
+    """
+    执行缺陷检测、保存标注图并写入检测记录（在任务工作线程中运行）
+    Args:
+        filename: 客户端上传的文件名
+        original_name: 内容寻址的原图文件名
+        detect_stats: 统计字典, 已包含上传和解码阶段的耗时
+        received_at: 收到请求时的 time.perf_counter(), 用于统计排队时间和总耗时
+        durable: 见 record_detection
+    Returns:
+        与 /upload 相同的响应数据
+    """
+    detect_stats = {} if detect_stats is None else detect_stats
+    if received_at is not None:
+        # 提交任务之后到工作线程开始执行之间的等待
+        waited = time.perf_counter() - received_at - sum(detect_stats.get('timings', {}).values()) / 1000
+        add_timing(detect_stats, 'queue', max(waited, 0.0))
+
+    # ✅ 用数字判断模型版本
+    detector_version = detectors.resolve(model_version)
+    if scheduler is not None:
+        detections, annotated_image = scheduler.submit(detector_version, img, detect_stats)
+    else:
+        detections, annotated_image = detectors[detector_version].process_image(img, stats=detect_stats)
+
+    with timed(detect_stats, 'imwrite'):
+        draw_name = content_store.put_image(annotated_image, os.path.splitext(original_name)[1])
+    rendition_writer.submit(annotated_image, draw_name)
+
+    result, _ = record_detection(current_user_id, original_name, draw_name, detections, detect_stats, model_version,
+                                 durable=durable)
+    result['filename'] = filename
+    if received_at is not None:
+        observe_request(detect_stats['timings'], detector_version, time.perf_counter() - received_at)
+    return result
+
+
+def submit_upload(current_user_id):
+    """
+    解码上传的图像并提交检测任务
+    Returns:
+        (job, None) 或 (None, 错误响应)
+    """
+    received_at = time.perf_counter()
+    file = request.files.get('file')
     model_version = request.form.get('version', 'YOLOv11')
+    if not file or not allowed_file(file.filename):
+        return None, (jsonify({'status': 0, 'message': 'Invalid file'}), 200)
 
     print(datetime.datetime.now(), file.filename, "using model version:", model_version)
 
-    if file and allowed_file(file.filename):
-        filename = file.filename
-        src_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(src_path)
-
-        tmp_ct_path = os.path.join('./tmp/ct', filename)
-        shutil.copy(src_path, tmp_ct_path)
-
-        original_url = f'http://127.0.0.1:5003/tmp/ct/{filename}'
-        timestamp = int(time.time())
-        detected_url = f'http://127.0.0.1:5003/tmp/draw/{filename}?t={timestamp}'
-
-        try:
-            img = cv2.imread(tmp_ct_path)
-
-            # ✅ 用数字判断模型版本
-            if model_version == 'YOLOv8':
-                detections, annotated_image = yolov8_detector.process_image(img)
-            else:
-                detections, annotated_image = yolov11_detector.process_image(img)
-
-            draw_path = os.path.join('./tmp/draw', filename)
-            cv2.imwrite(draw_path, annotated_image)
+    filename = file.filename
+
+    # 直接从上传的内存数据解码, 原图按内容哈希命名, 在后台写入 uploads 并硬链接到 tmp/ct (相同内容只存一份)
+    detect_stats = {}
+    with timed(detect_stats, 'upload'):
+        data = file.read()
+    with timed(detect_stats, 'decode'):
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return None, (jsonify({'status': 0, 'message': 'Invalid file'}), 200)
+    with timed(detect_stats, 'upload'):
+        original_name = content_store.put_original(data, os.path.splitext(filename)[1])
+
+    # 启用后台批量写入时, 默认不等待记录提交; durable=1 时等待
+    durable = WRITE_BEHIND_CONFIG.get('durable', False) or request.values.get('durable') in ('1', 'true')
+    try:
+        job = job_manager.submit(current_user_id, detect_and_record, current_user_id, filename, original_name, img,
+                                 model_version, detect_stats, received_at, durable)
+    except JobQueueFull as e:
+        print(f"Defect detection error: {str(e)}")
+        return None, (jsonify({'status': 0, 'message': 'Server busy, please retry'}), 503)
+    return job, None
 
-            record_model = Record()
-            total_defects = len(detections)
-            defect_types = list(set(d['class'] for d in detections))
 
-            record_model.insert_record(
-                current_user_id,
-                original_url,
-                detected_url,
-                detections,
-                total_defects,
-                defect_types,
-                datetime.datetime.now(),
-                model_version
-            )
+# 同步接口: 提交任务并等待结果
+@app.route('/upload', methods=['GET', 'POST'])
+@token_required
+def upload_file(current_user_id):
+    job, error_response = submit_upload(current_user_id)
+    if error_response is not None:
+        return error_response
+
+    job_manager.wait(job)
+    if job.status == 'done':
+        response = jsonify(job.result)
+        # 各阶段耗时, 浏览器开发者工具的 Timing 面板可以直接显示
+        response.headers['Server-Timing'] = server_timing(job.result['defect_detection']['stats'].get('timings', {}))
+        return response
+    if job.busy:
+        return jsonify({'status': 0, 'message': 'Server busy, please retry'}), 503
+    return jsonify({'status': 0, 'message': 'Defect detection failed'})
 
-            return jsonify({
-                'status': 1,
-                'image_url': original_url,
-                'draw_url': detected_url,
-                'defect_detection': {
-                    'detections': detections,
-                    'total_defects': total_defects,
-                    'defect_types': defect_types
-                }
-            })
 
-        except Exception as e:
-            print(f"Defect detection error: {str(e)}")
-            return jsonify({'status': 0, 'message': 'Defect detection failed'})
+# 异步接口: 立即返回任务id
+@app.route('/api/jobs', methods=['POST'])
+@token_required
+def create_job(current_user_id):
+    job, error_response = submit_upload(current_user_id)
+    if error_response is not None:
+        return error_response
+    return jsonify({'status': 1, 'job_id': job.id, 'job_status': job.status}), 202
 
-    return jsonify({'status': 0, 'message': 'Invalid file'})
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(current_user_id, job_id):
+    job = job_manager.get(job_id, current_user_id)
+    if job is None:
+        return jsonify({'status': 0, 'message': 'Job not found'}), 404
+    return jsonify({'status': 1, 'job': job.to_dict()})
+
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+@token_required(allow_query_token=True)  # EventSource 无法设置 Authorization 请求头
+def job_events(current_user_id, job_id):
+    job = job_manager.get(job_id, current_user_id)
+    if job is None:
+        return jsonify({'status': 0, 'message': 'Job not found'}), 404
+
+    def stream():
+        for snapshot in job_manager.watch(job):
+            if snapshot is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield f"event: {snapshot['status']}\ndata: {json.dumps(snapshot)}\n\n"
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def bulk_inputs():
+    """
+    读取批量上传的文件列表: 一个 ZIP（字段 archive 或 file）或多个图像（字段 files）
+    Returns:
+        (任务字典列表, ZipFile 或 None), 图像数可能超过 BULK_CONFIG['max_files'], 由调用方拒绝
+    """
+    archive = request.files.get('archive') or request.files.get('file')
+    max_file_size = BULK_CONFIG.get('max_file_size', 20 * 1024 * 1024)
+
+    items = []
+    if archive is not None and archive.filename.lower().endswith('.zip'):
+        zf = zipfile.ZipFile(archive.stream)
+        for info in zf.infolist():
+            filename = os.path.basename(info.filename)
+            if info.is_dir() or filename.startswith('.') or info.filename.startswith('__MACOSX'):
+                continue
+            if not allowed_file(filename):
+                continue
+            item = {'index': len(items), 'filename': filename}
+            if info.file_size > max_file_size:
+                item['error'] = 'File too large'
+            else:
+                item['read'] = lambda info=info: zf.read(info)
+            items.append(item)
+        return items, zf
+
+    for file in request.files.getlist('files'):
+        item = {'index': len(items), 'filename': file.filename}
+        if not allowed_file(file.filename):
+            item['error'] = 'Invalid file'
+        else:
+            item['read'] = file.read
+        items.append(item)
+    return items, None
+
+
+def bulk_stages(current_user_id, model_version):
+    """
+    批量上传流水线的各个阶段: 解码 -> 检测 -> 绘制与编码 -> 写入数据库
+    """
+    detector_version = detectors.resolve(model_version)
+    detector = detectors[detector_version]
+    record_model = Record()
+
+    def decode(item):
+        data = item.pop('read')()
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError('Invalid image')
+        item['image'] = img
+        item['original_name'] = content_store.put_original(data, os.path.splitext(item['filename'])[1])
+        return item
+
+    def detect(item):
+        detect_stats = {}
+        if scheduler is not None:
+            # 多个检测线程同时提交, 调度器把它们合并成批次; 队列已满时等待而不是让图像失败
+            detections, image = scheduler.submit(detector_version, item.pop('image'), detect_stats, annotate=False,
+                                                 block=True)
+        else:
+            detections, image = detector.process_image(item.pop('image'), stats=detect_stats, annotate=False)
+        item.update(detections=detections, image=image, stats=detect_stats)
+        return item
+
+    def render_encode(item):
+        annotated_image = detector.visualize(item.pop('image'), item['detections'])
+        item['draw_name'] = content_store.put_image(annotated_image, os.path.splitext(item['original_name'])[1])
+        rendition_writer.submit(annotated_image, item['draw_name'])
+        return item
+
+    def insert(item):
+        # 启用后台批量写入时不逐条等待提交, 全部图像处理完后再统一确认
+        item['result'], item['written'] = record_detection(
+            current_user_id, item['original_name'], item['draw_name'], item.pop('detections'), item.pop('stats'),
+            model_version, record_model, durable=False)
+        return item
+
+    # 没有调度器时各线程的预处理并行, 推理在检测器的 inference_lock 内依次执行
+    detect_workers = BULK_CONFIG.get('detect_workers', 4)
+    return [
+        ('decode', decode, BULK_CONFIG.get('decode_workers', 2)),
+        ('detect', detect, detect_workers),
+        ('encode', render_encode, BULK_CONFIG.get('encode_workers', 2)),
+        ('insert', insert, 1)
+    ]
+
+
+# 批量上传: 各阶段流水线并行处理, 每张图像完成后立即以 NDJSON 返回一行结果
+@app.route('/api/upload/bulk', methods=['POST'])
+@token_required
+def bulk_upload(current_user_id):
+    model_version = request.form.get('version', 'YOLOv11')
+    try:
+        items, zf = bulk_inputs()
+    except zipfile.BadZipFile:
+        return jsonify({'status': 0, 'message': 'Invalid archive'}), 400
+    if not items:
+        return jsonify({'status': 0, 'message': 'No images'}), 400
+    max_files = BULK_CONFIG.get('max_files', 500)
+    if len(items) > max_files:
+        # 整个请求拒绝, 不静默丢弃超出的图像
+        if zf is not None:
+            zf.close()
+        return jsonify({'status': 0, 'message': f'Too many images: {len(items)} > {max_files}'}), 413
+
+    print(datetime.datetime.now(), f"bulk upload of {len(items)} images using model version:", model_version)
+    pipeline = StagedPipeline(bulk_stages(current_user_id, model_version), queue_size=BULK_CONFIG.get('queue_size', 4))
+
+    def stream():
+        start = time.perf_counter()
+        succeeded = 0
+        pending_writes = []
+        try:
+            for item in pipeline.run(items):
+                line = {'index': item['index'], 'filename': item['filename'], 'timings': item.get('timings', {})}
+                if 'error' in item:
+                    line.update(status=0, message=item['error'])
+                else:
+                    line.update(item['result'])
+                    succeeded += 1
+                    if item.get('written') is not None:
+                        pending_writes.append((item['index'], item['written']))
+                yield json.dumps(line) + '\n'
+            # 汇总行在所有记录提交到数据库之后返回
+            write_failed = []
+            for index, written in pending_writes:
+                if written.exception() is not None:
+                    write_failed.append(index)
+            yield json.dumps({'summary': {
+                'total': len(items),
+                'succeeded': succeeded - len(write_failed),
+                'failed': len(items) - succeeded + len(write_failed),
+                'record_failed': write_failed,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000, 1)
+            }}) + '\n'
+        finally:
+            if zf is not None:
+                zf.close()
+
+    return Response(stream_with_context(stream()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @app.route("/download", methods=['GET'])
@@ -251,25 +598,75 @@ def download_file(current_user_id):
 #         return jsonify({'error': 'File not found'}), 404
 @app.route('/tmp/<path:file>', methods=['GET'])
 def show_photo(file):
-    filepath = os.path.join('tmp', file)
-    if os.path.exists(filepath):
-        ext = os.path.splitext(file)[1].lower()
-        content_type = {
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.png': 'image/png',
-            '.bmp': 'image/bmp'
-        }.get(ext, 'application/octet-stream')
-
-        with open(filepath, 'rb') as f:
-            image_data = f.read()
-        response = make_response(image_data)
-        response.headers['Content-Type'] = content_type
-        return response
+    # 刚上传的原图、缩略图可能还在后台写入
+    background_writer.wait(os.path.join('tmp', file))
+    rendition_writer.wait(os.path.join('tmp', file))
+    # send_from_directory 拒绝 tmp 之外的路径; 文件对象交给 WSGI 服务器发送 (支持时使用 sendfile),
+    # conditional=True 处理 If-None-Match / If-Modified-Since (304) 和 Range (206)
+    # 内容寻址的文件名, 同一 URL 的内容不会变化; 查询参数不影响缓存策略
+    versioned = is_content_name(file)
+    try:
+        response = send_from_directory(os.path.abspath('tmp'), file, conditional=True,
+                                       max_age=IMMUTABLE_MAX_AGE if versioned else 0)
+    except NotFound:
+        return jsonify({'error': 'File not found'}), 404
+
+    if versioned:
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        # 旧的客户端命名文件: 可能被同名上传覆盖, 每次用 ETag 重新验证
+        response.cache_control.no_cache = True
+    return response
+
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    status = warmup.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+
+@app.route('/api/scheduler/stats', methods=['GET'])
+@token_required
+def scheduler_stats(current_user_id):
+    if scheduler is None:
+        return jsonify({'status': 0, 'message': 'Scheduler disabled'})
+    return jsonify({'status': 1, 'scheduler': scheduler.stats()})
+
 
-    return jsonify({'error': 'File not found'}), 404
+@app.route('/api/models', methods=['GET'])
+@token_required
+def model_stats(current_user_id):
+    return jsonify({'status': 1, 'models': detectors.stats()})
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/db/stats', methods=['GET'])
+@token_required
+def db_stats(current_user_id):
+    return jsonify({
+        'status': 1,
+        'pool': get_pool().stats(),
+        'schema_version': current_version(),
+        'write_behind': record_writer.stats() if record_writer is not None else None
+    })
 
 
+@app.route('/api/storage/stats', methods=['GET'])
+@token_required
+def storage_stats(current_user_id):
+    return jsonify({'status': 1, 'storage': content_store.stats()})
+
+
+@app.route('/api/sam/stats', methods=['GET'])
+@token_required
+def sam_stats(current_user_id):
+    return jsonify({'status': 1, 'sam': get_sam_holder().stats()})
+
 
 @app.route('/api/user/info', methods=['GET'])
 @token_required
@@ -296,11 +693,27 @@ def get_user_info(current_user_id):
 @token_required
 def get_history(current_user_id):
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 10))
-
+        per_page = min(max(int(request.args.get('per_page', 10)), 1), HISTORY_MAX_PER_PAGE)
         record_model = Record()
-        records, total = record_model.get_records_by_user_paginated(current_user_id, page, per_page)
+        if record_writer is not None:
+            # 先写入队列中的记录, 用户能看到自己刚上传的检测结果
+            record_writer.flush(timeout=5)
+
+        if 'cursor' in request.args:
+            # 游标分页: ?cursor= 为第一页, 之后传上一页返回的 next_cursor; 总数可选
+            try:
+                records, next_cursor = record_model.get_records_by_user_after(
+                    current_user_id, request.args.get('cursor'), per_page)
+            except ValueError as e:
+                return jsonify({'status': 0, 'message': str(e)}), 400
+            pagination = {'per_page': per_page, 'next_cursor': next_cursor}
+            if request.args.get('include_total') in ('1', 'true'):
+                pagination['total'] = record_model.count_by_user(current_user_id)
+            return jsonify({'status': 1, 'records': records, 'pagination': pagination})
+
+        # 页码分页（兼容旧前端）, 总数取自每个用户的计数, 不再执行 COUNT(*)
+        page = max(int(request.args.get('page', 1)), 1)
+        records, total, next_cursor = record_model.get_records_by_user_paginated(current_user_id, page, per_page)
 
         return jsonify({
             'status': 1,
@@ -309,7 +722,8 @@ def get_history(current_user_id):
                 'total': total,
                 'page': page,
                 'per_page': per_page,
-                'total_pages': (total + per_page - 1) // per_page  # 向上取整
+                'total_pages': (total + per_page - 1) // per_page,  # 向上取整
+                'next_cursor': next_cursor
             }
         })
     except Exception as e:
@@ -336,5 +750,6 @@ def delete_history_record(current_user_id):
 if __name__ == '__main__':
     # with app.app_context():
     #     current_app.model = defect_detector
+    # 开发模式; 生产环境使用 python serve.py (预加载模型后 fork 多个工作进程)
     app.run(host='127.0.0.1', port=5003, debug=True)
 
@@ -7,6 +7,145 @@ MYSQL_CONFIG = {
     'port': 3306
 }
 
+# 数据库连接池配置（User 和 Record 共用）
+DB_POOL_CONFIG = {
+    'max_size': 10,  # 最多同时存在的连接数
+    'timeout': 10,  # 连接全部被占用时最多等待的秒数
+    'ping_interval': 30  # 空闲超过该秒数的连接在借出前先检查是否可用
+}
+
+# 检测记录后台批量写入（write-behind）: 记录先放入进程内队列, 后台线程按条数或时间合并成多行 INSERT
+WRITE_BEHIND_CONFIG = {
+    'enabled': False,  # False 时每个请求同步执行单条 INSERT 并提交
+    'max_batch': 200,  # 每次写入的最大条数
+    'flush_interval': 0.5,  # 记录在队列中最多等待的秒数
+    'max_pending': 10000,  # 队列上限, 写满时提交记录的线程阻塞
+    'durable': False  # True 时 /upload 等待记录提交后才返回; 也可以按请求传 durable=1
+}
+
 # JWT配置
 JWT_SECRET_KEY = 'your-secret-key'  # 请更改为一个安全的密钥
-JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24小时 
\ No newline at end of file
+JWT_ACCESS_TOKEN_EXPIRES = 24 * 60 * 60  # 24小时 
+
+# SAM配置
+SAM_CONFIG = {
+    'model_type': 'vit_h',
+    'checkpoint': None,  # None 表示使用 processor/sam_vit_h_4b8939.pth
+    'points_per_side': 1,
+    'preload': False,  # True 时在启动阶段加载; 启用预热时, 预加载的 YOLOv11 使用 SAM 提取钢板区域也会加载并预热
+    'idle_timeout': 0  # 空闲多少秒后卸载模型, 0 表示常驻
+}
+
+# YOLOv11 分块推理配置
+TILE_CONFIG = {
+    'max_batch_size': 8,  # 每次前向传播的最大分块数, 用于限制内存占用
+    'min_occupancy': 0.05  # 非背景像素比例低于该值的分块不做推理, 0 表示不跳过
+}
+
+# 标注图绘制配置
+RENDER_CONFIG = {
+    'renderer': 'fast'  # 'fast': 共享的 DetectionRenderer; 'builtin': 各检测器原来的绘制方式
+}
+
+# 钢板区域（ROI）提取配置
+ROI_CONFIG = {
+    'mode': 'sam',  # 'sam': SAM ViT-H 分割; 'classical': 低分辨率下的阈值/边缘/轮廓分割
+    'classical_max_side': 640  # classical 模式下分割时图像长边的尺寸
+}
+
+# 透视变换缓存配置（相机固定安装时使用）
+HOMOGRAPHY_CACHE_CONFIG = {
+    'enabled': False,
+    'revalidate_every': 30,  # 每隔多少帧强制完整重算, 0 表示只依赖角点校验
+    'patch_size': 32,  # 角点邻域边长（像素）
+    'max_patch_diff': 12.0  # 角点邻域灰度平均绝对差超过该值时重新计算
+}
+
+# 推理后端配置
+INFERENCE_CONFIG = {
+    'backend': 'ultralytics',  # 'ultralytics': PyTorch; 'onnx': ONNX Runtime CPU（使用与 .pt 同名的 .onnx 文件）
+    'onnx_intra_op_threads': 0,  # 0 表示由 ONNX Runtime 决定
+    'onnx_inter_op_threads': 0
+}
+
+# 模型版本（/upload 的 version 字段）, 新增版本只需在此添加
+# 版本名会写入 detection_record.model_version (VARCHAR(10))
+#   detector: 'yolov8' / 'yolov11' 或检测器类的完整路径 (如 'processor.yolov8_detector.YOLOv8Detector')
+#   path: 模型权重文件; backend: 'ultralytics' / 'onnx', 默认取 INFERENCE_CONFIG
+#   optional: 为 True 时权重文件不存在则不注册该版本
+MODEL_VERSIONS = {
+    'YOLOv8': {'detector': 'yolov8', 'path': 'dataset/runs/detect/neu_defect_yolov84/weights/best.pt'},
+    'YOLOv11': {'detector': 'yolov11', 'path': 'weights/best.pt'},
+    # INT8 量化模型（由 tools/quantize.py 生成）
+    'YOLOv8-Q8': {'detector': 'yolov8', 'path': 'dataset/runs/detect/neu_defect_yolov84/weights/best.int8.onnx',
+                  'backend': 'onnx', 'optional': True},
+    'YOLOv11-Q8': {'detector': 'yolov11', 'path': 'weights/best.int8.onnx', 'backend': 'onnx', 'optional': True}
+}
+
+# 模型注册表配置: 首次使用时加载, 超出内存预算时卸载最久未使用的模型
+MODEL_REGISTRY_CONFIG = {
+    'default_version': 'YOLOv11',  # 请求的版本不存在时使用
+    'memory_budget_mb': 0,  # 已加载模型的内存上限, 0 表示不限制
+    'preload': ['YOLOv8', 'YOLOv11']  # 启动时（预热线程中）加载的版本
+}
+
+# 启动预热配置
+WARMUP_CONFIG = {
+    'enabled': True,
+    'runs': 3,  # 冷启动之后再推理的次数
+    'frame_shape': (1080, 1920, 3)  # 相机图像尺寸 (见 camera.py)
+}
+
+# 微批处理推理调度配置（并发的 /upload 请求的前向传播合并为一次, 预处理和绘制仍在各请求线程中并行）
+SCHEDULER_CONFIG = {
+    'enabled': True,
+    'max_batch_size': 4,  # 每批最多的请求数（YOLOv11 每个请求有多个分块, 分块再按 TILE_CONFIG 分批）
+    'max_wait_ms': 10,  # 第一张图像到达后最多等待的时间
+    'max_queue_depth': 32  # 每个模型版本的最大排队数, 超过时返回 503
+}
+
+# 后台检测任务配置
+JOB_CONFIG = {
+    'max_workers': 8,  # 同时执行检测的工作线程数
+    'max_pending': 64,  # 排队和运行中的任务上限, 超过时返回 503
+    'retention': 3600,  # 已完成任务的结果保留秒数
+    # serve.py 多工作进程时任务状态写入该目录, 任一工作进程都能查询（不要放在 /tmp/<path> 提供的 tmp 目录下）
+    'state_dir': './jobs'
+}
+
+# 批量上传流水线配置（/api/upload/bulk）
+BULK_CONFIG = {
+    'queue_size': 4,  # 每个阶段输入队列的容量
+    'decode_workers': 2,  # 解码线程数
+    'detect_workers': 4,  # 同时提交推理的线程数, 与 SCHEDULER_CONFIG['max_batch_size'] 一致时可凑满批次
+    'encode_workers': 2,  # 绘制与 JPEG/PNG 编码线程数
+    'max_files': 500,  # 单次请求最多的图像数, 超过时整个请求返回 413
+    'max_file_size': 20 * 1024 * 1024  # ZIP 中单个文件解压后的大小上限（字节）
+}
+
+# 生产环境服务配置（serve.py）: 父进程加载并预热模型后 fork 工作进程, 模型权重在进程间写时复制共享
+SERVER_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 5003,
+    'workers': 4,  # 工作进程数, 0 表示单进程（不 fork）
+    'backlog': 128,
+    # 多工作进程时各进程的 /metrics 直方图写入该目录, 任一工作进程响应 /metrics 时合并全部进程的数据
+    'metrics_dir': './metrics'
+}
+
+# 标注图的缩略图和压缩版本（在后台线程池中生成, 历史记录列表只加载缩略图）
+RENDITION_CONFIG = {
+    'enabled': True,
+    'workers': 2,  # 编码线程数
+    'thumbnail_size': 320,  # 缩略图最长边（像素）
+    'thumbnail_format': 'jpg',  # 'jpg' 或 'webp'
+    'thumbnail_quality': 75,
+    'formats': {'webp': 80}  # 原尺寸压缩版本: {格式: 质量}, 如 {'webp': 80, 'jpg': 85}
+}
+
+# 内容寻址存储配置: 原图和标注图按 SHA-256 命名, 定期删除不再被 detection_record 引用的文件
+STORAGE_CONFIG = {
+    'gc_enabled': True,
+    'gc_interval': 3600,  # 清理间隔（秒）
+    'gc_min_age': 3600  # 只删除超过该时间未修改的文件（秒）, 避免删除刚上传、还未写入记录的文件
+}
@@ -0,0 +1,166 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import pymysql
+
+from config import MYSQL_CONFIG, DB_POOL_CONFIG
+
+
+class PoolTimeout(Exception):
+    """连接池中的连接全部被占用"""
+
+
+class ConnectionPool:
+    def __init__(self, config, max_size=10, timeout=10, ping_interval=30):
+        """
+        线程安全的 pymysql 连接池, User 和 Record 共用
+        Args:
+            config: pymysql.connect 的参数
+            max_size: 最多同时存在的连接数
+            timeout: 连接全部被占用时最多等待的秒数, 超时抛出 PoolTimeout
+            ping_interval: 空闲超过该秒数的连接在借出前先 ping 检查, 已断开时换成新连接
+        """
+        self.config = config
+        self.max_size = max_size
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle = queue.LifoQueue()  # (连接, 归还时间), 后进先出使常用连接保持活跃
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+        self.created = 0
+        self.reconnects = 0
+        self.discarded = 0
+        self.timeouts = 0
+        self.in_use = 0
+
+    def _check_fork(self):
+        """fork 出的子进程不能使用父进程的连接（共用同一个 socket）, 丢弃而不关闭"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._idle = queue.LifoQueue()
+                self._slots = threading.BoundedSemaphore(self.max_size)
+                self.in_use = 0
+                self._pid = os.getpid()
+
+    def _connect(self):
+        conn = pymysql.connect(**self.config)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _acquire(self):
+        self._check_fork()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"no database connection available within {self.timeout}s")
+        try:
+            try:
+                conn, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            else:
+                if time.monotonic() - released_at > self.ping_interval:
+                    # 健康检查: MySQL 会关闭 wait_timeout 内没有活动的连接
+                    try:
+                        conn.ping(reconnect=False)
+                    except pymysql.Error:
+                        conn = self._connect()
+                        with self._lock:
+                            self.reconnects += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+        return conn
+
+    def _release(self, conn, broken=False):
+        with self._lock:
+            self.in_use -= 1
+        if broken or not conn.open:
+            with self._lock:
+                self.discarded += 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接, 退出时归还; 出现异常时回滚, 连接错误时丢弃该连接"""
+        conn = self._acquire()
+        broken = False
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            broken = True
+            raise
+        except Exception:
+            try:
+                conn.rollback()
+            except pymysql.Error:
+                broken = True
+            raise
+        finally:
+            self._release(conn, broken)
+
+    @contextmanager
+    def cursor(self):
+        """借出连接并返回 DictCursor, 正常退出时提交"""
+        with self.connection() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                yield cursor
+            conn.commit()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'created': self.created,
+                'reconnects': self.reconnects,
+                'discarded': self.discarded,
+                'timeouts': self.timeouts
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """返回进程内共享的连接池, 按 DB_POOL_CONFIG 创建"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    MYSQL_CONFIG,
+                    max_size=DB_POOL_CONFIG.get('max_size', 10),
+                    timeout=DB_POOL_CONFIG.get('timeout', 10),
+                    ping_interval=DB_POOL_CONFIG.get('ping_interval', 30)
+                )
+    return _pool
@@ -0,0 +1,133 @@
+"""
+数据库结构的版本化迁移
+
+已执行的版本记录在 schema_migrations 表中, 启动时按版本号顺序执行尚未执行的迁移。
+MySQL 的 DDL 会隐式提交, 无法整体回滚, 所以每个迁移都先检查 information_schema, 重复执行不会出错。
+新增迁移: 在 MIGRATIONS 末尾追加 (版本号, 说明, 函数), 不要修改已发布的迁移。
+"""
+import time
+
+from models.db import get_pool
+from models.record import Record
+from models.user import User
+
+
+def column_exists(cursor, table, column):
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, column)
+    )
+    return cursor.fetchone()['n'] > 0
+
+
+def index_exists(cursor, table, index):
+    cursor.execute(
+        "SELECT COUNT(*) AS n FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (table, index)
+    )
+    return cursor.fetchone()['n'] > 0
+
+
+def create_tables(cursor):
+    # 原有的建表语句, 已有数据库上不做任何修改
+    User.create_table()
+    Record.create_table()
+
+
+def add_defect_columns(cursor):
+    # insert_record 一直写入这两列, 但建表语句中没有
+    if not column_exists(cursor, 'detection_record', 'total_defects'):
+        cursor.execute("ALTER TABLE detection_record ADD COLUMN total_defects INT NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE detection_record SET total_defects = COALESCE(JSON_LENGTH(detection_data), 0)")
+    if not column_exists(cursor, 'detection_record', 'defect_types'):
+        cursor.execute("ALTER TABLE detection_record ADD COLUMN defect_types JSON")
+
+
+def add_user_created_index(cursor, table='detection_record'):
+    # 历史记录按 user_id 过滤、按 created_at 排序; InnoDB 二级索引末尾隐含主键 id
+    # 外键 user_id 原来的单列索引会被这个索引替代
+    if not index_exists(cursor, table, 'idx_record_user_created'):
+        cursor.execute(f"CREATE INDEX idx_record_user_created ON {table} (user_id, created_at)")
+
+
+def add_user_record_counts(cursor):
+    # 每个用户的记录数, 由 Record.insert_record / delete_record 在同一事务中维护
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS user_record_counts (
+        user_id INT PRIMARY KEY,
+        total INT NOT NULL DEFAULT 0
+    )
+    """)
+    cursor.execute("""
+    INSERT INTO user_record_counts (user_id, total)
+    SELECT user_id, COUNT(*) FROM detection_record GROUP BY user_id
+    ON DUPLICATE KEY UPDATE total = VALUES(total)
+    """)
+
+
+MIGRATIONS = [
+    (1, 'create users and detection_record', create_tables),
+    (2, 'add detection_record.total_defects and defect_types', add_defect_columns),
+    (3, 'add index detection_record (user_id, created_at)', add_user_created_index),
+    (4, 'add user_record_counts', add_user_record_counts),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INT
+    )
+    """)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def migrate():
+    """
+    执行尚未执行的迁移
+    Returns:
+        本次执行的版本号列表
+    """
+    pool = get_pool()
+    with pool.cursor() as lock_cursor:
+        # 多个进程同时启动时只有一个执行迁移, 其他进程等待后看到已执行的版本
+        lock_cursor.execute("SELECT GET_LOCK('schema_migrations', 300) AS locked")
+        if not lock_cursor.fetchone()['locked']:
+            raise RuntimeError('timed out waiting for the schema migration lock')
+        try:
+            return _apply_pending(pool)
+        finally:
+            lock_cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+
+
+def _apply_pending(pool):
+    with pool.cursor() as cursor:
+        done = applied_versions(cursor)
+
+    executed = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        start = time.perf_counter()
+        with pool.cursor() as cursor:
+            fn(cursor)
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, description, duration_ms) VALUES (%s, %s, %s)",
+                (version, description, duration_ms)
+            )
+        print(f"migration {version} ({description}) applied in {duration_ms} ms")
+        executed.append(version)
+    return executed
+
+
+def current_version():
+    with get_pool().cursor() as cursor:
+        done = applied_versions(cursor)
+    return max(done) if done else 0
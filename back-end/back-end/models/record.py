@@ -1,15 +1,43 @@
+import base64
+import os
 from datetime import datetime
-import pymysql
-from config import MYSQL_CONFIG
+from urllib.parse import urlsplit
+from models.db import get_pool
+from utils.renditions import thumbnail_url
 import json
 
-class Record:
-    def __init__(self):
-        self.conn = pymysql.connect(**MYSQL_CONFIG)
-        self.cursor = self.conn.cursor(pymysql.cursors.DictCursor)
-        self.create_table()
+COUNTER_INCREMENT_SQL = """
+INSERT INTO user_record_counts (user_id, total) VALUES (%s, %s)
+ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+"""
+
+
+def encode_cursor(created_at, record_id):
+    """(created_at, id) -> 不透明的游标字符串"""
+    raw = f"{created_at.strftime('%Y-%m-%d %H:%M:%S.%f')}|{record_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
 
-    def create_table(self):
+def decode_cursor(token):
+    """
+    Returns:
+        (created_at, id)
+    Raises:
+        ValueError: 游标格式不正确
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        created_at, record_id = raw.split('|')
+        return datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S.%f'), int(record_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+class Record:
+    # 每个操作从连接池借用连接, 实例本身不持有连接
+    @staticmethod
+    def create_table():
+        """原始建表语句, 由 models/migrations.py 的第 1 个迁移执行, 之后的结构变更见后续迁移"""
         sql = """
         CREATE TABLE IF NOT EXISTS detection_record (
             id INT PRIMARY KEY AUTO_INCREMENT,
@@ -22,25 +50,66 @@ class Record:
             FOREIGN KEY (user_id) REFERENCES users(id)
         )
         """
-        self.cursor.execute(sql)
-        self.conn.commit()
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql)
 
     def insert_record(self, user_id, original_url, detected_url, detection_data, total_defects, defect_types, created_at, model_version):
         sql = '''
         INSERT INTO detection_record (user_id, original_image_url, detected_image_url, detection_data, total_defects, defect_types, created_at, model_version)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         '''
-        self.cursor.execute(sql, (
-            user_id,
-            original_url,
-            detected_url,
-            json.dumps(detection_data),
-            total_defects,
-            json.dumps(defect_types),
-            created_at,
-            model_version
-        ))
-        self.conn.commit()
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql, (
+                user_id,
+                original_url,
+                detected_url,
+                json.dumps(detection_data),
+                total_defects,
+                json.dumps(defect_types),
+                created_at,
+                model_version
+            ))
+            # 与记录在同一个事务中更新每个用户的记录数, 历史记录分页不再需要 COUNT(*)
+            cursor.execute(COUNTER_INCREMENT_SQL, (user_id, 1))
+
+    def insert_records(self, records):
+        """
+        用一条多行 INSERT 写入多条记录（RecordWriter 使用）, 同一事务中更新每个用户的记录数
+        Args:
+            records: [(user_id, original_url, detected_url, detection_data, total_defects, defect_types,
+                       created_at, model_version)], 与 insert_record 的参数相同
+        """
+        if not records:
+            return
+        values = []
+        counts = {}
+        for user_id, original_url, detected_url, detection_data, total_defects, defect_types, created_at, \
+                model_version in records:
+            values.extend([
+                user_id,
+                original_url,
+                detected_url,
+                json.dumps(detection_data),
+                total_defects,
+                json.dumps(defect_types),
+                created_at,
+                model_version
+            ])
+            counts[user_id] = counts.get(user_id, 0) + 1
+
+        sql = f'''
+        INSERT INTO detection_record (user_id, original_image_url, detected_image_url, detection_data, total_defects, defect_types, created_at, model_version)
+        VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(records))}
+        '''
+        # 按 user_id 顺序更新计数, 多个进程同时写入时加锁顺序一致, 不会死锁
+        counter_sql = f"""
+        INSERT INTO user_record_counts (user_id, total) VALUES {', '.join(['(%s, %s)'] * len(counts))}
+        ON DUPLICATE KEY UPDATE total = total + VALUES(total)
+        """
+        counter_args = [arg for user_id in sorted(counts) for arg in (user_id, counts[user_id])]
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql, values)
+            cursor.execute(counter_sql, counter_args)
 
     # def get_records_by_user(self, user_id):
     #     sql = "SELECT * FROM detection_record WHERE user_id = %s ORDER BY created_at DESC"
@@ -60,33 +129,105 @@ class Record:
     #     return records
 
     def get_records_by_user_paginated(self, user_id, page, per_page):
+        """
+        按页码分页（兼容旧接口）, 总数取自 user_record_counts
+        Returns:
+            (records, total, next_cursor)
+        """
         offset = (page - 1) * per_page
 
-        count_sql = "SELECT COUNT(*) as total FROM detection_record WHERE user_id = %s"
-        self.cursor.execute(count_sql, (user_id,))
-        total = self.cursor.fetchone()['total']
-
         sql = """
         SELECT * FROM detection_record
         WHERE user_id = %s
-        ORDER BY created_at DESC
+        ORDER BY created_at DESC, id DESC
         LIMIT %s OFFSET %s
         """
-        self.cursor.execute(sql, (user_id, per_page, offset))
-        rows = self.cursor.fetchall()
-        return [self._row_to_dict(row) for row in rows], total
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql, (user_id, per_page + 1, offset))
+            rows = cursor.fetchall()
+        total = self.count_by_user(user_id)
+        records, next_cursor = self._page(rows, per_page)
+        return records, total, next_cursor
+
+    def get_records_by_user_after(self, user_id, cursor_token, per_page):
+        """
+        按 (created_at, id) 的游标分页, 每页只扫描索引中的 per_page + 1 行, 与翻到第几页无关
+        Args:
+            cursor_token: 上一页返回的 next_cursor, 为空时返回第一页
+        Returns:
+            (records, next_cursor), 没有下一页时 next_cursor 为 None
+        """
+        if cursor_token:
+            created_at, record_id = decode_cursor(cursor_token)
+            sql = """
+            SELECT * FROM detection_record
+            WHERE user_id = %s AND (created_at < %s OR (created_at = %s AND id < %s))
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """
+            args = (user_id, created_at, created_at, record_id, per_page + 1)
+        else:
+            sql = """
+            SELECT * FROM detection_record
+            WHERE user_id = %s
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+            """
+            args = (user_id, per_page + 1)
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql, args)
+            rows = cursor.fetchall()
+        return self._page(rows, per_page)
+
+    def count_by_user(self, user_id, exact=False):
+        """
+        用户的记录数
+        Args:
+            exact: 为 True 时执行 COUNT(*), 否则读取 insert_record/delete_record 维护的计数
+        """
+        if exact:
+            sql = "SELECT COUNT(*) AS total FROM detection_record WHERE user_id = %s"
+        else:
+            sql = "SELECT total FROM user_record_counts WHERE user_id = %s"
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql, (user_id,))
+            row = cursor.fetchone()
+        return row['total'] if row else 0
+
+    def _page(self, rows, per_page):
+        """多取的一行用于判断是否还有下一页"""
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+        return [self._row_to_dict(row) for row in rows], next_cursor
 
     def delete_record(self, record_id, user_id):
         sql = "DELETE FROM detection_record WHERE id = %s AND user_id = %s"
-        affected_rows = self.cursor.execute(sql, (record_id, user_id))
-        self.conn.commit()
+        with get_pool().cursor() as cursor:
+            affected_rows = cursor.execute(sql, (record_id, user_id))
+            if affected_rows > 0:
+                cursor.execute(COUNTER_INCREMENT_SQL, (user_id, -affected_rows))
         return affected_rows > 0
 
+    def referenced_files(self):
+        """所有检测记录引用的原图和标注图文件名（供存储的保留期清理使用）"""
+        with get_pool().cursor() as cursor:
+            cursor.execute("SELECT original_image_url, detected_image_url FROM detection_record")
+            rows = cursor.fetchall()
+        names = set()
+        for row in rows:
+            for url in (row['original_image_url'], row['detected_image_url']):
+                if url:
+                    names.add(os.path.basename(urlsplit(url).path))
+        return names
+
     def _row_to_dict(self, row):
         return {
             'created_at': row['created_at'].strftime('%Y-%m-%d %H:%M:%S'),
             'original_image_url': row['original_image_url'],
             'detected_image_url': row['detected_image_url'],
+            # 列表视图只加载缩略图; 旧记录没有缩略图时为 None
+            'thumbnail_url': thumbnail_url(row['detected_image_url']),
             'detection_data': json.loads(row['detection_data']),
             'total_defects': row.get('total_defects', 0),
             'defect_types': json.loads(row['defect_types']) if row.get('defect_types') else [],
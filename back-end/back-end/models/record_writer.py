@@ -0,0 +1,180 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from models.record import Record
+
+_FLUSH = object()  # 队列中的刷新标记: 之前提交的记录全部写入后完成
+
+
+class RecordWriter:
+    def __init__(self, max_batch=200, flush_interval=0.5, max_pending=10000, record_model=None):
+        """
+        检测记录的后台批量写入（write-behind）
+        submit 把记录放入进程内队列后立即返回, 后台线程攒够 max_batch 条或第一条等待超过 flush_interval 秒时
+        用一条多行 INSERT 写入并提交。进程退出时（atexit 或 close）写完队列中的全部记录。
+        Args:
+            max_batch: 每次写入的最大条数
+            flush_interval: 记录在队列中最多等待的秒数
+            max_pending: 队列上限, 写满时 submit 阻塞, 数据库跟不上时对上游形成背压
+            record_model: Record, 默认新建
+        """
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.record_model = record_model or Record()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = os.getpid()
+        self.closed = False
+
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.retried_batches = 0
+        self.max_depth = 0
+        self.last_flush_ms = None
+        self.last_error = None
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        """写入线程在第一次提交时启动; fork 出的子进程不继承线程, 重新创建队列和线程"""
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_pending)
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='record-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, record):
+        """
+        提交一条记录
+        Args:
+            record: 与 Record.insert_record 参数相同的元组
+        Returns:
+            Future, 记录提交到数据库后完成, 写入失败时带有异常; 需要确认持久化时调用 .result()
+        """
+        future = Future()
+        if self.closed:
+            # 关闭之后提交的记录（如退出时仍在运行的任务）直接同步写入
+            self._write_one(record, future)
+            return future
+        self._ensure_thread()
+        self._queue.put((record, future))
+        with self._lock:
+            self.submitted += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return future
+
+    def flush(self, timeout=None):
+        """
+        等待此前提交的记录全部写入
+        Returns:
+            是否在 timeout 秒内完成
+        """
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return True
+        marker = Future()
+        self._queue.put((_FLUSH, marker))
+        try:
+            marker.result(timeout)
+        except FutureTimeout:
+            return False
+        return True
+
+    def close(self, timeout=30):
+        """停止接收记录并写完队列中剩余的记录, 重复调用无影响"""
+        if self.closed:
+            return
+        self.closed = True
+        self.flush(timeout)
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        """阻塞等待第一条记录, 再在 flush_interval 内攒够一批; 遇到刷新标记立即返回"""
+        batch, markers = [], []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            if item[0] is _FLUSH:
+                markers.append(item[1])
+                break
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, markers
+
+    def _loop(self):
+        while True:
+            batch, markers = self._collect()
+            if batch:
+                self._write(batch)
+            for marker in markers:
+                marker.set_result(True)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        try:
+            self.record_model.insert_records([record for record, _ in batch])
+        except Exception as e:
+            # 整批失败（如某条记录的数据不合法）时逐条重试, 只有写不进去的记录失败
+            print(f"Record batch insert failed, retrying {len(batch)} records one by one: {str(e)}")
+            with self._lock:
+                self.retried_batches += 1
+            for record, future in batch:
+                self._write_one(record, future)
+        else:
+            with self._lock:
+                self.written += len(batch)
+            for _, future in batch:
+                future.set_result(True)
+        with self._lock:
+            self.batches += 1
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 3)
+
+    def _write_one(self, record, future):
+        try:
+            self.record_model.insert_record(*record)
+        except Exception as e:
+            print(f"Record insert failed: {str(e)}")
+            with self._lock:
+                self.failed += 1
+                self.last_error = str(e)
+            future.set_exception(e)
+        else:
+            with self._lock:
+                self.written += 1
+            future.set_result(True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'submitted': self.submitted,
+                'written': self.written,
+                'failed': self.failed,
+                'batches': self.batches,
+                'avg_batch_size': round(self.written / self.batches, 2) if self.batches else 0,
+                'retried_batches': self.retried_batches,
+                'last_flush_ms': self.last_flush_ms,
+                'last_error': self.last_error
+            }
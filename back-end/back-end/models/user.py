@@ -1,14 +1,12 @@
 from datetime import datetime
 import pymysql
-from config import MYSQL_CONFIG
+from models.db import get_pool
 
 class User:
-    def __init__(self):
-        self.conn = pymysql.connect(**MYSQL_CONFIG)
-        self.cursor = self.conn.cursor(pymysql.cursors.DictCursor)
-        self.create_table()
-
-    def create_table(self):
+    # 每个操作从连接池借用连接, 实例本身不持有连接
+    @staticmethod
+    def create_table():
+        """建表, 由 models/migrations.py 的第 1 个迁移执行"""
         sql = """
         CREATE TABLE IF NOT EXISTS users (
             id INT AUTO_INCREMENT PRIMARY KEY,
@@ -19,14 +17,14 @@ class User:
             updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
         )
         """
-        self.cursor.execute(sql)
-        self.conn.commit()
+        with get_pool().cursor() as cursor:
+            cursor.execute(sql)
 
     def register(self, username, password, email):
         try:
             sql = "INSERT INTO users (username, password, email) VALUES (%s, %s, %s)"
-            self.cursor.execute(sql, (username, password, email))
-            self.conn.commit()
+            with get_pool().cursor() as cursor:
+                cursor.execute(sql, (username, password, email))
             return True
         except pymysql.Error as e:
             print(f"Error: {e}")
@@ -35,8 +33,9 @@ class User:
     def login(self, username, password):
         try:
             sql = "SELECT * FROM users WHERE username = %s AND password = %s"
-            self.cursor.execute(sql, (username, password))
-            user = self.cursor.fetchone()
+            with get_pool().cursor() as cursor:
+                cursor.execute(sql, (username, password))
+                user = cursor.fetchone()
             return user
         except pymysql.Error as e:
             print(f"Error: {e}")
@@ -45,8 +44,9 @@ class User:
     def get_user_by_username(self, username):
         try:
             sql = "SELECT * FROM users WHERE username = %s"
-            self.cursor.execute(sql, (username,))
-            return self.cursor.fetchone()
+            with get_pool().cursor() as cursor:
+                cursor.execute(sql, (username,))
+                return cursor.fetchone()
         except pymysql.Error as e:
             print(f"Error: {e}")
             return None
@@ -54,12 +54,9 @@ class User:
     def get_user_by_id(self, user_id):
         try:
             sql = "SELECT * FROM users WHERE id = %s"
-            self.cursor.execute(sql, (user_id,))
-            return self.cursor.fetchone()
+            with get_pool().cursor() as cursor:
+                cursor.execute(sql, (user_id,))
+                return cursor.fetchone()
         except pymysql.Error as e:
             print(f"Error: {e}")
-            return None
-
-    def __del__(self):
-        self.cursor.close()
-        self.conn.close() 
\ No newline at end of file
+            return None 
\ No newline at end of file
@@ -0,0 +1,75 @@
+# processor/annotator.py
+import zlib
+
+import cv2
+import numpy as np
+
+# Same palette as ultralytics, stored as BGR
+PALETTE_HEX = ('FF3838', 'FF9D97', 'FF701F', 'FFB21D', 'CFD231', '48F90A', '92CC17', '3DDB86', '1A9334', '00D4BB',
+               '2C99A8', '00C2FF', '344593', '6473FF', '0018EC', '8438FF', '520085', 'CB38FF', 'FF95C8', 'FF37C7')
+PALETTE = [tuple(int(h[i:i + 2], 16) for i in (4, 2, 0)) for h in PALETTE_HEX]
+
+
+class DetectionRenderer:
+    def __init__(self, class_names, font_scale=0.5):
+        """
+        根据已有的检测结果绘制标注, 不会再次调用模型
+        Args:
+            class_names: 类别名称列表（或 {id: name} 字典）
+            font_scale: 标签字体大小
+        """
+        if isinstance(class_names, dict):
+            class_names = [class_names[k] for k in sorted(class_names)]
+        self.font_scale = font_scale
+        # 类别颜色只计算一次
+        self.colors = {name: PALETTE[i % len(PALETTE)] for i, name in enumerate(class_names)}
+
+    def color(self, class_name):
+        color = self.colors.get(class_name)
+        if color is None:
+            color = PALETTE[zlib.crc32(class_name.encode('utf-8')) % len(PALETTE)]
+        return color
+
+    def render(self, image, detections, out=None, inplace=False):
+        """
+        绘制检测框和标签
+        Args:
+            image: 输入图像（BGR）
+            detections: 检测结果列表
+            out: 可选的输出缓冲区（与 image 同形状）, 用于跨请求复用内存
+            inplace: 为 True 时直接在 image 上绘制
+        Returns:
+            annotated_image: 标注后的图像
+        """
+        if inplace:
+            canvas = image
+        elif out is not None and out.shape == image.shape and out.dtype == image.dtype:
+            np.copyto(out, image)
+            canvas = out
+        else:
+            canvas = image.copy()
+
+        if not detections:
+            return canvas
+
+        line_width = max(round(sum(canvas.shape[:2]) / 2 * 0.003), 2)
+        font_thickness = max(line_width - 1, 1)
+        for det in detections:
+            x1, y1, x2, y2 = det['bbox']
+            color = self.color(det['class'])
+            label = f"{det['class']} {det['confidence']:.2f}"
+
+            # 绘制矩形框
+            cv2.rectangle(canvas, (x1, y1), (x2, y2), color, line_width)
+
+            # 绘制标签背景和文字, 框贴近上边缘时标签画在框内
+            (text_w, text_h), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale,
+                                                         font_thickness)
+            outside = y1 - text_h - baseline >= 0
+            top = y1 - text_h - baseline if outside else y1
+            bottom = y1 if outside else y1 + text_h + baseline
+            cv2.rectangle(canvas, (x1, top), (x1 + text_w, bottom), color, -1)
+            cv2.putText(canvas, label, (x1, bottom - baseline), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale,
+                        (255, 255, 255), font_thickness, cv2.LINE_AA)
+
+        return canvas
@@ -0,0 +1,176 @@
+# processor/batch_scheduler.py
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from utils.timing import timed, add_timing
+
+
+class SchedulerBusy(Exception):
+    """推理队列已满"""
+
+
+class _VersionQueue:
+    def __init__(self, version, scheduler):
+        self.version = version
+        self.scheduler = scheduler
+        self.queue = queue.Queue(maxsize=scheduler.max_queue_depth)
+
+        self.batches = 0
+        self.images = 0
+        self.batch_sizes = {}
+        self.inputs = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.errors = 0
+
+        self.thread = threading.Thread(target=self._loop, name=f'infer-{version}', daemon=True)
+        self.thread.start()
+
+    def _collect(self):
+        """阻塞等待第一个请求, 再在 max_wait 内凑满一个批次"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.scheduler.max_wait
+        while len(batch) < self.scheduler.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        # 推理线程只执行前向传播: 预处理、分块、合并和绘制都在提交请求的线程中并行执行
+        while True:
+            batch = self._collect()
+            dispatched = time.monotonic()
+            # 每批重新取检测器, 模型注册表可能已卸载并重新加载该版本
+            try:
+                detector = self.scheduler.detector(self.version, count=False)
+            except Exception as e:
+                print(f"Load {self.version} failed: {str(e)}")
+                for item in batch:
+                    self.errors += 1
+                    item[2].set_exception(e)
+                continue
+
+            inputs = [x for item in batch for x in item[0]]
+            start = time.perf_counter()
+            try:
+                outputs = detector.forward(inputs)
+            except Exception:
+                outputs = None
+            if outputs is not None:
+                # 整批一次推理, 每个请求都等待了整批的推理时间
+                inference_time = time.perf_counter() - start
+                offset = 0
+                for item_inputs, stats, future, _ in batch:
+                    if stats is not None:
+                        add_timing(stats, 'inference', inference_time)
+                    future.set_result(outputs[offset:offset + len(item_inputs)])
+                    offset += len(item_inputs)
+            else:
+                # 整批失败时逐个请求重试, 只让出错的请求失败
+                for item_inputs, stats, future, _ in batch:
+                    try:
+                        with timed(stats, 'inference'):
+                            future.set_result(detector.forward(item_inputs))
+                    except Exception as e:
+                        self.errors += 1
+                        future.set_exception(e)
+
+            with self.scheduler.lock:
+                self.batches += 1
+                self.images += len(batch)
+                self.inputs += len(inputs)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+                self.total_wait += sum(dispatched - item[3] for item in batch)
+
+    def submit(self, inputs, stats, block=False):
+        future = Future()
+        item = (inputs, stats, future, time.monotonic())
+        if block:
+            self.queue.put(item)
+        else:
+            try:
+                self.queue.put_nowait(item)
+            except queue.Full:
+                raise SchedulerBusy(f"{self.version} inference queue is full")
+        with self.scheduler.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+        return future
+
+    def stats(self):
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth_seen': self.max_depth,
+            'batches': self.batches,
+            'images': self.images,
+            'avg_batch_size': round(self.images / self.batches, 2) if self.batches else 0,
+            'avg_inputs_per_batch': round(self.inputs / self.batches, 2) if self.batches else 0,
+            'batch_sizes': dict(sorted(self.batch_sizes.items())),
+            'avg_queue_wait_ms': round(self.total_wait / self.images * 1000, 2) if self.images else 0,
+            'errors': self.errors
+        }
+
+
+class InferenceScheduler:
+    def __init__(self, detectors, max_batch_size=4, max_wait_ms=10, max_queue_depth=32):
+        """
+        按模型版本收集并发请求的推理输入（YOLOv11 的分块或 YOLOv8 的整帧）, 凑成批次后一次前向传播
+        检测器的 prepare（预处理、分块）和 finish（合并、绘制）在提交请求的线程中执行, 只有 forward 进入队列
+        Args:
+            detectors: {版本名: 检测器} 或 ModelRegistry, 检测器需实现 prepare / forward / finish
+            max_batch_size: 每批最多的请求数
+            max_wait_ms: 第一张图像到达后最多等待多少毫秒凑批
+            max_queue_depth: 每个模型版本的最大排队数, 超过时 submit 抛出 SchedulerBusy
+        """
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_depth = max_queue_depth
+        self.detectors = detectors
+        self.lock = threading.Lock()
+        self._queues = {}
+
+    def detector(self, version, count=True):
+        """
+        取检测器; 请求数只在 submit 中计入, 推理线程每批重新获取时传 count=False
+        """
+        if isinstance(self.detectors, dict):
+            return self.detectors[version]
+        return self.detectors.get(version, count=count)
+
+    def _queue(self, version):
+        """每个模型版本的队列和推理线程在第一次提交时创建"""
+        with self.lock:
+            if version not in self._queues:
+                self._queues[version] = _VersionQueue(version, self)
+            return self._queues[version]
+
+    def submit(self, version, image, stats=None, timeout=None, annotate=True, block=False):
+        """
+        处理一张图像: 在当前线程预处理, 排队等待批量前向传播, 再在当前线程合并结果并绘制
+        Args:
+            annotate: 为 False 时不绘制标注图, 返回待绘制的图像
+            block: 为 True 时队列已满则等待（批量上传的背压）, 否则抛出 SchedulerBusy
+        Returns:
+            (detections, annotated_image)
+        """
+        detector = self.detector(version)
+        inputs, context = detector.prepare(image, stats)
+        outputs = []
+        if inputs:  # 分块全部被跳过时不需要推理
+            outputs = self._queue(version).submit(inputs, stats, block).result(timeout=timeout)
+        return detector.finish(context, outputs, stats, annotate)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'max_queue_depth': self.max_queue_depth,
+                'versions': {version: q.stats() for version, q in self._queues.items()}
+            }
@@ -0,0 +1,91 @@
+# processor/homography_cache.py
+import threading
+
+import cv2
+
+
+class HomographyCache:
+    def __init__(self, revalidate_every=30, patch_size=32, max_patch_diff=12.0):
+        """
+        固定机位下复用上一次计算出的钢板掩码和透视变换, 只做廉价的角点邻域校验
+        Args:
+            revalidate_every: 每隔多少帧强制完整重算一次, 0 表示只依赖角点校验
+            patch_size: 角点邻域的边长（像素）
+            max_patch_diff: 角点邻域灰度平均绝对差的阈值, 超过则认为钢板位置发生了变化
+        """
+        self.revalidate_every = revalidate_every
+        self.patch_size = patch_size
+        self.max_patch_diff = max_patch_diff
+
+        self._lock = threading.Lock()
+        self._entry = None
+        self._frames_since_full = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.validation_failures = 0
+
+    def _patches(self, gray, corners):
+        half = self.patch_size // 2
+        height, width = gray.shape[:2]
+        patches = []
+        for x, y in corners:
+            x0, y0 = max(0, x - half), max(0, y - half)
+            x1, y1 = min(width, x + half), min(height, y + half)
+            patches.append(gray[y0:y1, x0:x1].copy())
+        return patches
+
+    def lookup(self, image_bgr):
+        """
+        Args:
+            image_bgr: 当前帧
+        Returns:
+            (segmentation_mask, homography, size), 校验失败或需要重算时返回 None
+        """
+        with self._lock:
+            entry = self._entry
+            if entry is None or entry['shape'] != image_bgr.shape:
+                self.misses += 1
+                return None
+            if self.revalidate_every and self._frames_since_full >= self.revalidate_every:
+                self.misses += 1
+                return None
+
+            gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+            for cached, current in zip(entry['patches'], self._patches(gray, entry['corners'])):
+                if cached.size == 0 or cv2.absdiff(cached, current).mean() > self.max_patch_diff:
+                    self.validation_failures += 1
+                    self.misses += 1
+                    return None
+
+            self._frames_since_full += 1
+            self.hits += 1
+            return entry['mask'], entry['homography'], entry['size']
+
+    def store(self, image_bgr, segmentation_mask, corners, homography, size):
+        """保存一次完整计算的结果"""
+        gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
+        entry = {
+            'shape': image_bgr.shape,
+            'mask': segmentation_mask,
+            'corners': [(int(x), int(y)) for x, y in corners],
+            'homography': homography,
+            'size': size
+        }
+        entry['patches'] = self._patches(gray, entry['corners'])
+        with self._lock:
+            self._entry = entry
+            self._frames_since_full = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._entry = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'validation_failures': self.validation_failures,
+                'frames_since_full': self._frames_since_full
+            }
@@ -0,0 +1,235 @@
+# processor/jobs.py
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from processor.batch_scheduler import SchedulerBusy
+
+FINISHED = ('done', 'failed')
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    """排队中的任务数已达上限"""
+
+
+class Job:
+    def __init__(self, owner):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.busy = False  # 因推理队列已满而失败, 同步接口返回 503
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0  # 每次状态变化加一, 用于 SSE 推送
+        self.remote = False  # 由其他工作进程执行, 状态从共享目录读取
+
+    @classmethod
+    def from_state(cls, state):
+        """由共享目录中的状态文件（JobManager._publish 写入）创建只读的任务"""
+        job = cls(state['owner'])
+        job.id = state['job_id']
+        for key in ('status', 'result', 'error', 'busy', 'created_at', 'started_at', 'finished_at', 'version'):
+            setattr(job, key, state[key])
+        job.remote = True
+        return job
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    def __init__(self, max_workers=4, max_pending=64, retention=3600):
+        """
+        后台检测任务: 有界的工作线程池 + 任务状态表
+        Args:
+            max_workers: 工作线程数
+            max_pending: 排队和运行中的任务总数上限, 超过时 submit 抛出 JobQueueFull
+            retention: 已完成的任务保留多少秒, 之后从状态表中删除
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self.state_dir = None
+        self._last_sweep = 0.0
+
+    def share_state(self, state_dir):
+        """
+        在 state_dir 中为每个任务保存一份状态文件, 供其他进程查询
+        pre-fork 时各工作进程共用一个监听套接字, 查询任务的请求多半不会落到提交任务的进程上;
+        serve.py 在 fork 之前调用, 并清空上次运行留下的文件
+        """
+        os.makedirs(state_dir, exist_ok=True)
+        for name in os.listdir(state_dir):
+            os.remove(os.path.join(state_dir, name))
+        self.state_dir = state_dir
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _publish(self, job):
+        """写入任务的状态文件（先写临时文件再改名, 读者不会看到不完整的内容）, 调用方需持有 self._cond"""
+        if self.state_dir is None:
+            return
+        state = dict(job.to_dict(), owner=job.owner, busy=job.busy, version=job.version)
+        path = self._state_path(job.id)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def _load_remote(self, job_id):
+        if self.state_dir is None or not JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return Job.from_state(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _prune(self):
+        """删除过期的已完成任务, 调用方需持有 self._cond"""
+        now = time.time()
+        expire = now - self.retention
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < expire]:
+            del self._jobs[job_id]
+            if self.state_dir is not None:
+                try:
+                    os.remove(self._state_path(job_id))
+                except OSError:
+                    pass
+        if self.state_dir is not None and now - self._last_sweep > 60:
+            # 已退出的工作进程留下的状态文件没有进程负责删除, 按修改时间清理
+            self._last_sweep = now
+            for entry in os.scandir(self.state_dir):
+                try:
+                    if entry.stat().st_mtime < expire:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def submit(self, owner, fn, *args):
+        """
+        提交任务, 立即返回
+        Args:
+            owner: 任务所属用户id
+            fn: 在工作线程中执行的函数, 返回值作为任务结果
+        Returns:
+            Job
+        """
+        with self._cond:
+            self._prune()
+            active = sum(1 for j in self._jobs.values() if not j.finished)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"{active} detection jobs pending")
+            job = Job(owner)
+            self._jobs[job.id] = job
+            self._publish(job)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def _update(self, job, **fields):
+        with self._cond:
+            for key, value in fields.items():
+                setattr(job, key, value)
+            job.version += 1
+            self._publish(job)
+            self._cond.notify_all()
+
+    def _run(self, job, fn, args):
+        self._update(job, status='running', started_at=time.time())
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"Job {job.id} failed: {str(e)}")
+            # 不保存异常对象: 其 traceback 引用的栈帧持有解码后的图像和分块, 会在保留期内一直占用内存
+            self._update(job, status='failed', error=str(e), busy=isinstance(e, SchedulerBusy),
+                         finished_at=time.time())
+        else:
+            self._update(job, status='done', result=result, finished_at=time.time())
+
+    def get(self, job_id, owner=None):
+        """
+        Returns:
+            Job; 本进程没有该任务时从共享目录读取（Job.remote 为 True）, 不存在时返回 None
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load_remote(job_id)
+        if job is None or (owner is not None and job.owner != owner):
+            return None
+        return job
+
+    def wait(self, job, timeout=None):
+        """阻塞直到任务完成（同步接口使用）"""
+        with self._cond:
+            self._cond.wait_for(lambda: job.finished, timeout=timeout)
+        return job
+
+    def watch(self, job, heartbeat=15):
+        """
+        任务状态变化时产出状态字典, 超过 heartbeat 秒没有变化时产出 None, 任务完成后结束
+        """
+        if job.remote:
+            yield from self._watch_remote(job, heartbeat)
+            return
+        last_version = -1
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: job.version != last_version, timeout=heartbeat)
+                changed = job.version != last_version
+                last_version = job.version
+                snapshot = job.to_dict() if changed else None
+                finished = job.finished
+            yield snapshot
+            if finished and changed:
+                return
+
+    def _watch_remote(self, job, heartbeat, poll_interval=0.5):
+        """其他进程的任务: 每 poll_interval 秒读取一次状态文件, 产出的内容与 watch 相同"""
+        last_version = -1
+        last_yield = time.monotonic()
+        while True:
+            if job.version != last_version:
+                last_version = job.version
+                last_yield = time.monotonic()
+                yield job.to_dict()
+                if job.finished:
+                    return
+            elif time.monotonic() - last_yield >= heartbeat:
+                last_yield = time.monotonic()
+                yield None
+            time.sleep(poll_interval)
+            job = self._load_remote(job.id)
+            if job is None:  # 已过期删除
+                return
+
+    def stats(self):
+        with self._cond:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {'max_workers': self.max_workers, 'max_pending': self.max_pending, 'jobs': counts}
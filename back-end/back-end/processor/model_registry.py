@@ -0,0 +1,188 @@
+# processor/model_registry.py
+import importlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DETECTOR_CLASSES = {
+    'yolov8': 'processor.yolov8_detector.YOLOv8Detector',
+    'yolov11': 'processor.yolov11_detector.YOLOv11Detector'
+}
+
+
+def _resident_bytes():
+    """当前进程的常驻内存（Linux 读取 /proc/self/statm, 其他平台返回 0）"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def model_bytes(detector):
+    """
+    估计检测器模型占用的内存
+    Returns:
+        PyTorch 模型参数与 buffer 的字节数; 无法取得时返回 None
+    """
+    module = getattr(getattr(detector, 'model', None), 'model', None)
+    if module is None or not hasattr(module, 'parameters'):
+        return None
+    tensors = list(module.parameters()) + list(module.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def load_detector(spec):
+    """按配置项创建检测器"""
+    module_name, class_name = DETECTOR_CLASSES.get(spec['detector'], spec['detector']).rsplit('.', 1)
+    detector_cls = getattr(importlib.import_module(module_name), class_name)
+    kwargs = dict(spec.get('kwargs', {}))
+    if spec.get('backend'):
+        kwargs['backend'] = spec['backend']
+    return detector_cls(spec['path'], **kwargs)
+
+
+class _Entry:
+    def __init__(self, version, spec):
+        self.version = version
+        self.spec = spec
+        self.detector = None
+        self.bytes = 0
+        self.load_lock = threading.Lock()
+        self.load_count = 0
+        self.last_load_time = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+
+
+class ModelRegistry:
+    def __init__(self, versions, default_version=None, memory_budget_mb=0):
+        """
+        按版本名管理检测器: 首次使用时加载, 超出内存预算时卸载最久未使用的模型
+        Args:
+            versions: {版本名: 配置项}, 见 config.MODEL_VERSIONS
+            default_version: 请求的版本不存在时使用的版本
+            memory_budget_mb: 已加载模型的内存上限, 0 表示不限制
+        """
+        self._entries = {}
+        for version, spec in versions.items():
+            if spec.get('optional') and not os.path.exists(spec['path']):
+                continue
+            self._entries[version] = _Entry(version, spec)
+        self.default_version = default_version or next(iter(self._entries))
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()  # 版本名 -> _Entry, 按最近使用排序
+
+    def __contains__(self, version):
+        return version in self._entries
+
+    def __getitem__(self, version):
+        return self.get(version)
+
+    def versions(self):
+        return list(self._entries)
+
+    def resolve(self, version):
+        """未注册的版本名回退到默认版本"""
+        return version if version in self._entries else self.default_version
+
+    def get(self, version, count=True):
+        """
+        返回已加载的检测器, 未加载时先加载
+        Args:
+            version: 版本名
+            count: 是否计入该版本的请求数和最近使用时间（推理调度器每批重新获取时为 False）
+        Returns:
+            检测器
+        """
+        entry = self._entries[version]
+        with self._lock:
+            if count:
+                entry.requests += 1
+                entry.last_used = time.time()
+            if entry.detector is not None:
+                self._loaded.move_to_end(version)
+                return entry.detector
+
+        # 同一版本只加载一次, 不同版本可以并行加载
+        with entry.load_lock:
+            if entry.detector is None:
+                self._load(entry)
+            detector = entry.detector
+        return detector
+
+    def _load(self, entry):
+        start = time.perf_counter()
+        rss_before = _resident_bytes()
+        detector = load_detector(entry.spec)
+        entry.last_load_time = time.perf_counter() - start
+        estimated = model_bytes(detector)
+        if estimated is None:
+            # ONNX 等无法直接统计参数的后端用加载前后的常驻内存差估计
+            estimated = max(_resident_bytes() - rss_before, os.path.getsize(entry.spec['path']))
+        print(f"model {entry.version} loaded in {entry.last_load_time:.2f}s, ~{estimated / 1024 / 1024:.0f} MB")
+
+        with self._lock:
+            entry.detector = detector
+            entry.bytes = estimated
+            entry.load_count += 1
+            self._loaded[entry.version] = entry
+            self._evict_over_budget(keep=entry.version)
+
+    def _evict_over_budget(self, keep):
+        """按最近最少使用顺序卸载模型直到不超过预算, 调用方需持有 self._lock"""
+        if self.memory_budget <= 0:
+            return
+        for version in list(self._loaded):
+            if self.loaded_bytes() <= self.memory_budget:
+                break
+            if version != keep:
+                self._unload_locked(version)
+
+    def _unload_locked(self, version):
+        entry = self._loaded.pop(version)
+        # 正在使用该检测器的请求持有引用, 推理结束后才真正释放
+        entry.detector = None
+        self.evictions += 1
+        print(f"model {version} evicted, {self.loaded_bytes() / 1024 / 1024:.0f} MB still loaded")
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def unload(self, version):
+        with self._lock:
+            if version in self._loaded:
+                self._unload_locked(version)
+
+    def loaded(self):
+        """已加载的 {版本名: 检测器}"""
+        with self._lock:
+            return {version: entry.detector for version, entry in self._loaded.items()}
+
+    def loaded_bytes(self):
+        return sum(entry.bytes for entry in self._loaded.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                'default_version': self.default_version,
+                'memory_budget_mb': round(self.memory_budget / 1024 / 1024, 1),
+                'loaded_mb': round(self.loaded_bytes() / 1024 / 1024, 1),
+                'evictions': self.evictions,
+                'versions': {
+                    version: {
+                        'loaded': entry.detector is not None,
+                        'memory_mb': round(entry.bytes / 1024 / 1024, 1),
+                        'load_count': entry.load_count,
+                        'last_load_time': round(entry.last_load_time, 3),
+                        'requests': entry.requests,
+                        'last_used': entry.last_used or None
+                    } for version, entry in self._entries.items()
+                }
+            }
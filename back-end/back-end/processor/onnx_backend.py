@@ -0,0 +1,138 @@
+# processor/onnx_backend.py
+import ast
+import os
+
+import cv2
+import numpy as np
+import onnxruntime as ort
+
+MAX_WH = 7680  # class offset for class-aware NMS, larger than any image side
+
+
+def onnx_path_for(model_path):
+    """best.pt -> best.onnx（ultralytics export 的默认输出位置）"""
+    root, ext = os.path.splitext(model_path)
+    return model_path if ext == '.onnx' else root + '.onnx'
+
+
+def letterbox(image, new_shape=640, color=(114, 114, 114)):
+    """
+    等比例缩放并填充到 new_shape x new_shape
+    Returns:
+        image: 填充后的图像
+        ratio: 缩放比例
+        pad: (左, 上) 填充像素
+    """
+    height, width = image.shape[:2]
+    ratio = min(new_shape / height, new_shape / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if (new_w, new_h) != (width, height):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    dw, dh = (new_shape - new_w) / 2, (new_shape - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, ratio, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """NumPy 实现的 NMS, 返回按得分降序保留的下标"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+class OnnxYOLO:
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0, imgsz=640, iou_threshold=0.7,
+                 max_det=300):
+        """
+        基于 ONNX Runtime (CPU) 的 YOLOv8/YOLOv11 推理后端
+        Args:
+            model_path: ultralytics 导出的 .onnx 文件
+            intra_op_threads: 单个算子内部的线程数, 0 表示由 ONNX Runtime 决定
+            inter_op_threads: 算子之间并行的线程数, 0 表示由 ONNX Runtime 决定
+            imgsz: 模型输入为动态尺寸时使用的输入边长
+            iou_threshold: NMS 的 IoU 阈值（与 ultralytics 默认值一致）
+            max_det: 每张图最多保留的检测框
+        """
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        self.imgsz = height if isinstance(height, int) else imgsz
+        # ultralytics 默认导出固定 batch=1, dynamic=True 导出时才能一次送入多张图
+        self.dynamic_batch = not isinstance(batch, int)
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+
+    def preprocess(self, image_bgr):
+        image, ratio, pad = letterbox(image_bgr, self.imgsz)
+        # BGR -> RGB, HWC -> CHW, 0-255 -> 0-1
+        blob = image[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+        return blob, ratio, pad
+
+    def postprocess(self, output, ratio, pad, image_shape, conf_threshold):
+        """
+        Args:
+            output: 单张图的模型输出, 形状 (4 + nc, anchors)
+        Returns:
+            (N, 6) 的 [x1, y1, x2, y2, score, class_id], 坐标已映射回原图
+        """
+        output = output.T
+        class_scores = output[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores > conf_threshold
+        output, scores, class_ids = output[keep], scores[keep], class_ids[keep]
+        if len(scores) == 0:
+            return np.zeros((0, 6), dtype=np.float32)
+
+        # cx, cy, w, h -> x1, y1, x2, y2
+        boxes = np.empty((len(scores), 4), dtype=np.float32)
+        boxes[:, :2] = output[:, :2] - output[:, 2:4] / 2
+        boxes[:, 2:] = output[:, :2] + output[:, 2:4] / 2
+
+        # Class-aware NMS by offsetting boxes of different classes
+        indices = nms(boxes + class_ids[:, None] * MAX_WH, scores, self.iou_threshold)[:self.max_det]
+        boxes, scores, class_ids = boxes[indices], scores[indices], class_ids[indices]
+
+        # Map back to the original image
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, image_shape[1])
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, image_shape[0])
+        return np.concatenate([boxes, scores[:, None], class_ids[:, None].astype(np.float32)], axis=1)
+
+    def predict(self, images, conf=0.25):
+        """
+        Args:
+            images: BGR 图像列表
+            conf: 置信度阈值
+        Returns:
+            与 images 一一对应的 (N, 6) 数组列表
+        """
+        prepared = [self.preprocess(image) for image in images]
+        if self.dynamic_batch and len(prepared) > 1:
+            outputs = self.session.run(None, {self.input_name: np.stack([p[0] for p in prepared])})[0]
+        else:
+            outputs = [self.session.run(None, {self.input_name: p[0][None]})[0][0] for p in prepared]
+        return [self.postprocess(output, ratio, pad, image.shape, conf)
+                for output, (_, ratio, pad), image in zip(outputs, prepared, images)]
@@ -0,0 +1,102 @@
+# processor/pipeline.py
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StagedPipeline:
+    def __init__(self, stages, queue_size=4):
+        """
+        多阶段流水线: 每个阶段一个线程, 阶段之间用有界队列连接, 各阶段同时处理不同的图像
+        Args:
+            stages: [(阶段名, 函数)] 或 [(阶段名, 函数, 线程数)] 列表, 函数接收并返回任务字典;
+                抛出异常时该任务跳过后续阶段
+            queue_size: 每个阶段输入队列的容量
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self._cancel = threading.Event()
+
+    def _put(self, q, item):
+        # 消费者断开后不再阻塞在满队列上
+        while not self._cancel.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._cancel.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return None
+
+    def _worker(self, name, fn, in_queue, out_queue, remaining):
+        while True:
+            item = self._get(in_queue)
+            if item is None:
+                return
+            if item is _DONE:
+                # 同阶段的其他线程也需要收到结束标记, 最后一个退出的线程通知下一阶段
+                with remaining['lock']:
+                    remaining['count'] -= 1
+                    last = remaining['count'] == 0
+                if last:
+                    self._put(out_queue, _DONE)
+                else:
+                    self._put(in_queue, _DONE)
+                return
+            if 'error' not in item:
+                start = time.perf_counter()
+                try:
+                    item = fn(item)
+                except Exception as e:
+                    print(f"Pipeline stage {name} error: {str(e)}")
+                    item['error'] = f"{name}: {str(e)}"
+                item.setdefault('timings', {})[name] = round((time.perf_counter() - start) * 1000, 1)
+            if not self._put(out_queue, item):
+                return
+
+    def _feed(self, items, out_queue):
+        try:
+            for item in items:
+                if not self._put(out_queue, item):
+                    return
+        except Exception as e:
+            print(f"Pipeline input error: {str(e)}")
+        self._put(out_queue, _DONE)
+
+    def run(self, items):
+        """
+        Args:
+            items: 任务字典的可迭代对象
+        Returns:
+            生成器, 按完成顺序产出处理后的任务字典
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._feed, args=(items, queues[0]), daemon=True)]
+        for i, stage in enumerate(self.stages):
+            name, fn = stage[:2]
+            workers = stage[2] if len(stage) > 2 else 1
+            remaining = {'lock': threading.Lock(), 'count': workers}
+            for n in range(workers):
+                threads.append(threading.Thread(target=self._worker,
+                                                args=(name, fn, queues[i], queues[i + 1], remaining),
+                                                name=f'pipeline-{name}-{n}', daemon=True))
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    return
+                yield item
+        finally:
+            self._cancel.set()
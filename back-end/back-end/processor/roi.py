@@ -0,0 +1,65 @@
+# processor/roi.py
+import cv2
+import numpy as np
+
+
+def classical_plate_mask(image_bgr, max_side=640):
+    """
+    用传统OpenCV分割（阈值 + 边缘 + 轮廓）在低分辨率下找到钢板区域, 作为SAM的快速替代
+    Args:
+        image_bgr: 输入图像（BGR）
+        max_side: 分割时图像长边缩放到的尺寸
+    Returns:
+        mask: 与输入同尺寸的布尔掩码, 找不到轮廓时返回全 True
+    """
+    height, width = image_bgr.shape[:2]
+    scale = min(1.0, max_side / float(max(height, width)))
+    small = cv2.resize(image_bgr, (max(1, int(width * scale)), max(1, int(height * scale))),
+                       interpolation=cv2.INTER_AREA) if scale < 1.0 else image_bgr
+
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+    # Otsu threshold separates plate and background; edges close gaps along the plate border
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    edges = cv2.dilate(cv2.Canny(gray, 50, 150), cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (7, 7))
+    candidates = []
+    # The plate may be brighter or darker than the background, so try both polarities
+    for region in (binary, cv2.bitwise_not(binary)):
+        region = cv2.morphologyEx(cv2.bitwise_or(region, edges), cv2.MORPH_CLOSE, kernel, iterations=2)
+        contours, _ = cv2.findContours(region, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        candidates.extend(contours)
+
+    small_h, small_w = gray.shape[:2]
+    image_area = float(small_h * small_w)
+    best = None
+    best_score = 0.0
+    for c in candidates:
+        area = cv2.contourArea(c)
+        # Ignore tiny blobs and regions covering (almost) the whole frame, i.e. the background itself
+        if area < 0.05 * image_area or area > 0.98 * image_area:
+            continue
+        hull = cv2.convexHull(c)
+        # Prefer large, compact (rectangle-like) regions
+        score = area * (area / max(cv2.contourArea(hull), 1.0))
+        if score > best_score:
+            best, best_score = hull, score
+
+    if best is None:
+        return np.ones((height, width), dtype=bool)
+
+    small_mask = np.zeros((small_h, small_w), dtype=np.uint8)
+    cv2.drawContours(small_mask, [best], -1, 1, thickness=-1)
+    if small_mask.shape[:2] != (height, width):
+        small_mask = cv2.resize(small_mask, (width, height), interpolation=cv2.INTER_NEAREST)
+    return small_mask.astype(bool)
+
+
+def mask_iou(mask_a, mask_b):
+    """两个布尔掩码的IoU"""
+    union = np.logical_or(mask_a, mask_b).sum()
+    if union == 0:
+        return 1.0
+    return float(np.logical_and(mask_a, mask_b).sum()) / float(union)
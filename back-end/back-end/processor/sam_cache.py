@@ -0,0 +1,175 @@
+# processor/sam_cache.py
+import os
+import threading
+import time
+
+import torch
+from segment_anything import sam_model_registry, SamAutomaticMaskGenerator
+
+from config import SAM_CONFIG
+
+DEFAULT_CHECKPOINT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sam_vit_h_4b8939.pth')
+
+
+class SamModelHolder:
+    def __init__(self, checkpoint_path=None, model_type='vit_h', points_per_side=1, idle_timeout=0):
+        """
+        进程内共享的SAM模型, 只加载一次并复用SamAutomaticMaskGenerator
+        Args:
+            checkpoint_path: SAM权重文件路径
+            model_type: sam_model_registry 中的模型类型
+            points_per_side: 传给SamAutomaticMaskGenerator的采样点数
+            idle_timeout: 空闲多少秒后卸载模型, 0 表示常驻
+        """
+        self.checkpoint_path = checkpoint_path or DEFAULT_CHECKPOINT
+        self.model_type = model_type
+        self.points_per_side = points_per_side
+        self.idle_timeout = idle_timeout
+
+        # SamAutomaticMaskGenerator 内部的 predictor 会保存当前图像的状态, 不能并发调用
+        self._lock = threading.Lock()
+        # 统计数据单独加锁, stats() 不必等待正在进行的推理（ViT-H 一次要几秒）
+        self._stats_lock = threading.Lock()
+        self._generator = None
+        self._device = None
+        self._last_used = 0.0
+        self._idle_thread = None
+        self._idle_stop = None
+
+        self.load_count = 0
+        self.last_load_time = 0.0
+        self.total_load_time = 0.0
+        self.request_count = 0
+
+    @property
+    def loaded(self):
+        return self._generator is not None
+
+    def _load(self):
+        """加载SAM模型, 调用方需持有 self._lock"""
+        start = time.perf_counter()
+        self._device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        sam = sam_model_registry[self.model_type](checkpoint=self.checkpoint_path).to(device=self._device)
+        self._generator = SamAutomaticMaskGenerator(sam, points_per_side=self.points_per_side)
+
+        load_time = time.perf_counter() - start
+        with self._stats_lock:
+            self.last_load_time = load_time
+            self.total_load_time += load_time
+            self.load_count += 1
+        print(f"SAM {self.model_type} loaded on {self._device} in {load_time:.2f}s")
+
+    def load(self):
+        """预加载模型（启动阶段调用）"""
+        with self._lock:
+            if self._generator is None:
+                self._load()
+            self._last_used = time.monotonic()
+            self._start_idle_check()
+
+    def pin(self):
+        """
+        加载模型并常驻, 取消空闲卸载（pre-fork 的父进程在 fork 之前调用）
+        空闲检查是后台线程, fork 之前必须结束; 工作进程中卸载后重新加载会变成各进程独占的一份
+        """
+        with self._lock:
+            self.idle_timeout = 0
+            thread, self._idle_thread = self._idle_thread, None
+            if self._idle_stop is not None:
+                self._idle_stop.set()
+        if thread is not None:
+            thread.join()
+        self.load()
+
+    def unload(self):
+        """释放模型占用的内存/显存"""
+        with self._lock:
+            self._unload_locked()
+
+    def _unload_locked(self):
+        if self._generator is None:
+            return
+        self._generator = None
+        if self._device is not None and self._device.type == 'cuda':
+            torch.cuda.empty_cache()
+        print(f"SAM {self.model_type} unloaded")
+
+    def generate(self, image_rgb):
+        """
+        生成分割掩码
+        Args:
+            image_rgb: RGB格式图像
+        Returns:
+            SamAutomaticMaskGenerator.generate 的结果
+        """
+        with self._lock:
+            if self._generator is None:
+                self._load()
+            with self._stats_lock:
+                self.request_count += 1
+            result = self._generator.generate(image_rgb)
+            self._last_used = time.monotonic()
+            self._start_idle_check()
+        return result
+
+    def _start_idle_check(self):
+        """启动空闲检查线程（每个 holder 只有一个, 常驻到 pin）, 调用方需持有 self._lock"""
+        if self.idle_timeout <= 0 or self._idle_thread is not None:
+            return
+        self._idle_stop = threading.Event()
+        self._idle_thread = threading.Thread(target=self._idle_loop, args=(self._idle_stop,), name='sam-idle',
+                                             daemon=True)
+        self._idle_thread.start()
+
+    def _idle_loop(self, stop):
+        """在最近一次使用 idle_timeout 秒之后检查, 期间没有新的请求则卸载模型"""
+        delay = self.idle_timeout
+        while not stop.wait(delay):
+            with self._lock:
+                if self.idle_timeout <= 0:
+                    return
+                remaining = self._last_used + self.idle_timeout - time.monotonic()
+                if self._generator is not None and remaining <= 0:
+                    self._unload_locked()
+                # 已卸载时下一次 load / generate 会更新 _last_used, 按完整的 idle_timeout 再检查
+                delay = max(remaining, 1.0) if self._generator is not None else self.idle_timeout
+
+    def stats(self):
+        """
+        统计信息
+        Returns:
+            dict: 加载次数、加载耗时以及相对每次请求都重新加载所节省的时间
+        """
+        with self._stats_lock:
+            avg_load_time = self.total_load_time / self.load_count if self.load_count else 0.0
+            return {
+                'model_type': self.model_type,
+                'loaded': self._generator is not None,
+                'device': str(self._device) if self._device is not None else None,
+                'load_count': self.load_count,
+                'last_load_time': round(self.last_load_time, 3),
+                'request_count': self.request_count,
+                'idle_timeout': self.idle_timeout,
+                # 旧实现每个请求都会加载一次模型
+                'saved_per_request': round(avg_load_time, 3),
+                'saved_total': round(avg_load_time * max(self.request_count - self.load_count, 0), 3)
+            }
+
+
+_holder = None
+_holder_lock = threading.Lock()
+
+
+def get_sam_holder():
+    """返回进程内共享的SamModelHolder, 按 SAM_CONFIG 创建"""
+    global _holder
+    if _holder is None:
+        with _holder_lock:
+            if _holder is None:
+                _holder = SamModelHolder(
+                    checkpoint_path=SAM_CONFIG.get('checkpoint'),
+                    model_type=SAM_CONFIG.get('model_type', 'vit_h'),
+                    points_per_side=SAM_CONFIG.get('points_per_side', 1),
+                    idle_timeout=SAM_CONFIG.get('idle_timeout', 0)
+                )
+    return _holder
@@ -0,0 +1,110 @@
+# processor/tile_planner.py
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class TilePlan:
+    def __init__(self, height, width, overlap):
+        """
+        计算某一分辨率下的分块布局
+        Args:
+            height: 图像高度
+            width: 图像宽度
+            overlap: 相邻分块的重叠比例
+        """
+        self.height = height
+        self.width = width
+        self.overlap = overlap
+        self.tile_size = max(640, min(height, width) // 2)
+        stride = int(self.tile_size * (1 - overlap))  # Calculate stride based on overlap
+
+        self.coordinates = []  # (x, y, w, h), also used as merge offsets
+        self.edge_indices = []  # tiles that are smaller than tile_size and need padding
+        for y in range(0, height, stride):
+            for x in range(0, width, stride):
+                # Ensure tile doesn't exceed image boundaries
+                y_end = min(y + self.tile_size, height)
+                x_end = min(x + self.tile_size, width)
+                if (y_end - y) >= self.tile_size * 0.5 and (x_end - x) >= self.tile_size * 0.5:
+                    if (y_end - y) < self.tile_size or (x_end - x) < self.tile_size:
+                        self.edge_indices.append(len(self.coordinates))
+                    self.coordinates.append((x, y, x_end - x, y_end - y))
+
+    def __len__(self):
+        return len(self.coordinates)
+
+
+def tile_occupancy(image, coordinates):
+    """
+    用积分图计算每个分块中非背景（非纯黑）像素的比例
+    Args:
+        image: 输入图像, 背景为0
+        coordinates: 分块的 (x, y, w, h) 列表
+    Returns:
+        occupancy: 每个分块的前景比例
+    """
+    mask = image.any(axis=2) if image.ndim == 3 else image > 0
+    integral = cv2.integral(mask.view(np.uint8))
+    occupancy = np.empty(len(coordinates), dtype=np.float32)
+    for i, (x, y, w, h) in enumerate(coordinates):
+        count = integral[y + h, x + w] - integral[y, x + w] - integral[y + h, x] + integral[y, x]
+        occupancy[i] = count / float(w * h)
+    return occupancy
+
+
+class TilePlanner:
+    def __init__(self, max_plans=16):
+        """
+        按 (height, width, overlap) 缓存分块布局
+        透视校正后的尺寸由每张图像检测到的角点决定, 只有尺寸重复出现时才会命中
+        （开启透视变换缓存的固定机位, 或尺寸固定的输入）; 布局本身很小, 未命中的代价只是重新计算坐标
+        Args:
+            max_plans: 最多缓存的布局数量
+        """
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, height, width, overlap):
+        key = (height, width, overlap)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = TilePlan(height, width, overlap)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def tiles(self, image, overlap=0.1):
+        """
+        将图像划分为有重叠的分块
+        内部分块直接返回原图的视图, 只有边缘分块会被复制到填充缓冲区中
+        （缓冲区每次新分配, 不在线程中保留: 尺寸很少重复, 保留的缓冲区几乎不会被再次使用）
+        Args:
+            image: 输入图像
+            overlap: 相邻分块的重叠比例
+        Returns:
+            tiles: 分块图像列表
+            coordinates: 每个分块在原图中的 (x, y, w, h)
+        """
+        height, width = image.shape[:2]
+        plan = self.plan(height, width, overlap)
+        channels = image.shape[2] if image.ndim == 3 else 1
+
+        tiles = [image[y:y + h, x:x + w] for x, y, w, h in plan.coordinates]
+        if plan.edge_indices:
+            buffer = np.zeros((len(plan.edge_indices), plan.tile_size, plan.tile_size, channels), dtype=image.dtype)
+            for slot, index in enumerate(plan.edge_indices):
+                x, y, w, h = plan.coordinates[index]
+                padded_tile = buffer[slot] if image.ndim == 3 else buffer[slot, ..., 0]
+                padded_tile[:h, :w] = tiles[index]
+                tiles[index] = padded_tile
+
+        return tiles, plan.coordinates
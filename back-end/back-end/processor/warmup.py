@@ -0,0 +1,126 @@
+# processor/warmup.py
+import threading
+import time
+
+import numpy as np
+
+
+class DetectorWarmup:
+    def __init__(self, runs=3, frame_shape=(1080, 1920, 3)):
+        """
+        启动阶段用合成图像预热所有检测器, 记录冷启动与预热后的延迟
+        Args:
+            runs: 冷启动之后再推理的次数, 用于统计预热后的延迟
+            frame_shape: 相机图像尺寸, YOLOv8 按此尺寸做 640 letterbox, YOLOv11 按此尺寸估计分块大小
+        """
+        self.runs = max(1, runs)
+        self.frame_shape = frame_shape
+        self.ready = False
+        self.error = None
+        self.report = {}
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _inputs(self, detector):
+        """返回 (名称, 推理函数) 列表, 覆盖检测器实际会遇到的输入尺寸"""
+        rng = np.random.default_rng(0)
+        if hasattr(detector, 'predict_tiles'):
+            # YOLOv11: 与 create_tiles 相同的分块大小, 满批次和单个分块各一次
+            height, width = self.frame_shape[:2]
+            tile_size = detector.tile_planner.plan(height, width, 0.3).tile_size
+            tiles = [rng.integers(0, 256, (tile_size, tile_size, 3), dtype=np.uint8)
+                     for _ in range(detector.max_batch_size)]
+            return [
+                (f'tiles {tile_size}x{len(tiles)}', lambda: detector.predict_tiles(tiles)),
+                (f'tiles {tile_size}x1', lambda: detector.predict_tiles(tiles[:1]))
+            ]
+        # YOLOv8: 整帧推理, 模型内部 letterbox 到 640
+        frame = rng.integers(0, 256, self.frame_shape, dtype=np.uint8)
+        return [('frame 640', lambda: detector.predict_boxes(frame))]
+
+    def warmup_sam(self, sam_holder):
+        """
+        加载 SAM 并在合成的相机图像上分割一次（首次 generate 的初始化开销最大）
+        只执行一次: ViT-H 在 CPU 上每次需要数秒
+        """
+        if not sam_holder.loaded:
+            sam_holder.load()
+        report = {'load_ms': round(sam_holder.last_load_time * 1000, 1)}
+
+        # 深色背景上的一块钢板, 与实际图像的分割结果类似
+        height, width = self.frame_shape[:2]
+        frame = np.full((height, width, 3), 30, dtype=np.uint8)
+        frame[height // 6:height * 5 // 6, width // 6:width * 5 // 6] = 160
+        start = time.perf_counter()
+        sam_holder.generate(frame)
+        report['generate_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        print(f"warmup SAM: load {report['load_ms']:.1f} ms, generate {report['generate_ms']:.1f} ms")
+        return report
+
+    def warmup_detector(self, name, detector):
+        report = {}
+        for input_name, infer in self._inputs(detector):
+            start = time.perf_counter()
+            infer()
+            cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(self.runs):
+                infer()
+            warm = (time.perf_counter() - start) / self.runs
+
+            report[input_name] = {'cold_ms': round(cold * 1000, 1), 'warm_ms': round(warm * 1000, 1)}
+            print(f"warmup {name} [{input_name}]: cold {cold * 1000:.1f} ms, warm {warm * 1000:.1f} ms")
+        return report
+
+    def run(self, detectors, sam_holder=None, versions=None):
+        """
+        预热与请求可能同时进行（/upload 不等待 ready）: 检测器的前向传播在 inference_lock 内执行,
+        SAM 在 SamModelHolder 的锁内执行, 预热不会与请求同时调用同一个模型
+        Args:
+            detectors: {版本名: 检测器} 或 ModelRegistry
+            sam_holder: 需要预热的 SamModelHolder, 为 None 时不预热;
+                        使用 SAM 提取钢板区域的检测器（YOLOv11, roi_mode='sam'）总会预热它使用的 SAM
+            versions: 需要预热的版本名, 默认为 detectors 中的全部版本; 使用模型注册表时会先加载这些版本
+        """
+        self.started_at = time.time()
+        try:
+            for name in (versions if versions is not None else list(detectors.keys())):
+                detector = detectors[name]
+                if getattr(detector, 'roi_mode', None) == 'sam':
+                    sam_holder = detector.sam
+                report = self.warmup_detector(name, detector)
+                with self._lock:
+                    self.report[name] = report
+            if sam_holder is not None:
+                report = self.warmup_sam(sam_holder)
+                with self._lock:
+                    self.report['SAM'] = report
+        except Exception as e:
+            print(f"Warmup error: {str(e)}")
+            self.error = str(e)
+        self.finished_at = time.time()
+        # 预热失败不阻止服务, 只是首个请求会变慢
+        self.ready = True
+        print(f"warmup finished in {self.finished_at - self.started_at:.1f}s")
+
+    def start(self, detectors, sam_holder=None, versions=None):
+        """在后台线程中预热, 服务可以立即启动"""
+        self._thread = threading.Thread(target=self.run, args=(detectors, sam_holder, versions), daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        """等待后台预热线程结束（fork 工作进程之前调用）"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'error': self.error,
+                'duration': round(self.finished_at - self.started_at, 2) if self.finished_at else None,
+                'detectors': dict(self.report)
+            }
@@ -1,21 +1,61 @@
 # processor/yolov11_detector.py
+import threading
 import cv2
 import numpy as np
 from ultralytics import YOLO
 import torch
-import os
-from segment_anything import sam_model_registry, SamAutomaticMaskGenerator
+from torchvision.ops import batched_nms
+from processor.sam_cache import get_sam_holder
+from processor.tile_planner import TilePlanner, tile_occupancy
+from processor.annotator import DetectionRenderer
+from processor.roi import classical_plate_mask
+from processor.homography_cache import HomographyCache
+from utils.timing import timed
+from config import TILE_CONFIG, RENDER_CONFIG, ROI_CONFIG, HOMOGRAPHY_CACHE_CONFIG, INFERENCE_CONFIG
 
 
 class YOLOv11Detector:
-    def __init__(self, model_path):
+    def __init__(self, model_path, max_batch_size=None, min_tile_occupancy=None, renderer=None, roi_mode=None,
+                 backend=None):
         """
         初始化YOLOv11检测器
         Args:
             model_path: 模型权重文件路径
+            max_batch_size: 分块推理时每批最多的分块数, 默认取 TILE_CONFIG
+            min_tile_occupancy: 分块中非背景像素的最小比例, 低于该值的分块跳过推理, 默认取 TILE_CONFIG
+            renderer: 'fast' 使用共享的 DetectionRenderer, 'builtin' 使用原来的逐框绘制, 默认取 RENDER_CONFIG
+            roi_mode: 钢板区域提取方式, 'sam' 或 'classical', 默认取 ROI_CONFIG
+            backend: 'ultralytics' 或 'onnx', 默认取 INFERENCE_CONFIG
         """
-        self.model = YOLO(model_path)
+        self.backend = backend or INFERENCE_CONFIG['backend']
+        if self.backend == 'onnx':
+            from processor.onnx_backend import OnnxYOLO, onnx_path_for
+            self.model = OnnxYOLO(onnx_path_for(model_path),
+                                  intra_op_threads=INFERENCE_CONFIG.get('onnx_intra_op_threads', 0),
+                                  inter_op_threads=INFERENCE_CONFIG.get('onnx_inter_op_threads', 0))
+        else:
+            self.model = YOLO(model_path)
         self.classes = ['scratches']
+        self.device = "0" if torch.cuda.is_available() else "cpu"
+        self.max_batch_size = max(1, max_batch_size or TILE_CONFIG['max_batch_size'])
+        if min_tile_occupancy is None:
+            min_tile_occupancy = TILE_CONFIG.get('min_occupancy', 0)
+        self.min_tile_occupancy = min_tile_occupancy
+        self.render_mode = renderer or RENDER_CONFIG['renderer']
+        self.renderer = DetectionRenderer(self.model.names)
+        self.roi_mode = roi_mode or ROI_CONFIG['mode']
+        self.homography_cache = None
+        if HOMOGRAPHY_CACHE_CONFIG.get('enabled'):
+            self.homography_cache = HomographyCache(
+                revalidate_every=HOMOGRAPHY_CACHE_CONFIG.get('revalidate_every', 30),
+                patch_size=HOMOGRAPHY_CACHE_CONFIG.get('patch_size', 32),
+                max_patch_diff=HOMOGRAPHY_CACHE_CONFIG.get('max_patch_diff', 12.0)
+            )
+        self.sam = get_sam_holder()
+        self.tile_planner = TilePlanner()
+        # ultralytics 的 predictor 保存每次调用的状态, 不能被多个线程同时调用;
+        # 没有调度器时任务线程、批量上传和启动预热都会直接调用, 只串行化前向传播, 预处理仍然并行
+        self.inference_lock = threading.Lock()
 
     def order_points(self, pts):
         '''Rearrange coordinates to order:
@@ -36,34 +76,27 @@ class YOLOv11Detector:
         # Return the ordered coordinates.
         return rect.astype('int').tolist()
 
-    def preprocess_image(self, image_bgr):
-
-        DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        # print(torch.cuda.is_available(), DEVICE)
-        MODEL_TYPE = "vit_h"
-
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        CHECKPOINT_PATH = os.path.join(script_dir, 'sam_vit_h_4b8939.pth')
-
-        sam = sam_model_registry[MODEL_TYPE](checkpoint=CHECKPOINT_PATH).to(device=DEVICE)
-        mask_generator = SamAutomaticMaskGenerator(sam, points_per_side=1)
+    def segment_plate(self, image_bgr, roi_mode=None):
+        """
+        分割出钢板区域
+        Args:
+            image_bgr: 输入图像（BGR）
+            roi_mode: 'sam' 或 'classical', 默认取 self.roi_mode
+        Returns:
+            segmentation_mask: 与输入同尺寸的布尔掩码
+        """
+        if (roi_mode or self.roi_mode) == 'classical':
+            return classical_plate_mask(image_bgr, ROI_CONFIG.get('classical_max_side', 640))
 
         image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
 
-        sam_result = mask_generator.generate(image_rgb)
-
-        segmentation_mask = sam_result[0]['segmentation']
+        # SAM模型在进程内只加载一次
+        sam_result = self.sam.generate(image_rgb)
 
-        # Convert the segmentation mask to a binary mask
-        binary_mask = np.where(segmentation_mask == True, 1, 0)
-        black_background = np.ones_like(image_bgr) * 0
-
-        # Apply the binary mask
-        new_image = np.where(binary_mask[..., np.newaxis] == 1, image_bgr, black_background)
-
-        # Making Copy of original image.
-        orig_img = new_image.copy()
+        return sam_result[0]['segmentation']
 
+    def find_plate_corners(self, new_image):
+        """Find the four ordered plate corners in a background-masked image."""
         # Create the sharpening kernel
         kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
 
@@ -96,8 +129,15 @@ class YOLOv11Detector:
         corners = sorted(np.concatenate(corners).tolist())
 
         # Rearranging the order of the corner points.
-        corners = self.order_points(corners)
+        return self.order_points(corners)
 
+    def compute_homography(self, corners):
+        """
+        根据四个角点计算透视变换
+        Returns:
+            homography: 3x3 透视变换矩阵
+            size: 输出图像尺寸 (maxWidth, maxHeight)
+        """
         (tl, tr, br, bl) = corners
         # Finding the maximum width.
         widthA = np.sqrt(((br[0] - bl[0]) ** 2) + ((br[1] - bl[1]) ** 2))
@@ -117,113 +157,148 @@ class YOLOv11Detector:
 
         # Getting the homography.
         homography = cv2.getPerspectiveTransform(np.float32(corners), np.float32(destination_corners))
+        return np.float32(homography), (maxWidth, maxHeight)
+
+    def preprocess_image(self, image_bgr, roi_mode=None, stats=None):
+        """
+        去除背景并对钢板做透视校正
+        Args:
+            image_bgr: 输入图像（BGR）
+            roi_mode: 'sam' 或 'classical', 默认取 self.roi_mode
+            stats: 可选的字典, 用于返回是否命中透视变换缓存
+        Returns:
+            final: 校正后的钢板图像
+        """
+        cached = self.homography_cache.lookup(image_bgr) if self.homography_cache is not None else None
+        if cached is not None:
+            # 固定机位: 复用上一次的掩码和透视变换
+            segmentation_mask, homography, size = cached
+            new_image = np.where(segmentation_mask[..., np.newaxis], image_bgr, 0).astype(image_bgr.dtype,
+                                                                                           copy=False)
+        else:
+            segmentation_mask = self.segment_plate(image_bgr, roi_mode)
+
+            # Apply the binary mask, everything outside the plate becomes black
+            new_image = np.where(segmentation_mask[..., np.newaxis], image_bgr, 0).astype(image_bgr.dtype,
+                                                                                           copy=False)
+
+            corners = self.find_plate_corners(new_image)
+            homography, size = self.compute_homography(corners)
+            if self.homography_cache is not None:
+                self.homography_cache.store(image_bgr, segmentation_mask, corners, homography, size)
+        if stats is not None and self.homography_cache is not None:
+            stats['homography_cache'] = 'hit' if cached is not None else 'miss'
+
         # Perspective transform using homography.
-        final = cv2.warpPerspective(orig_img, np.float32(homography), (maxWidth, maxHeight), flags=cv2.INTER_LINEAR)
+        final = cv2.warpPerspective(new_image, homography, size, flags=cv2.INTER_LINEAR)
 
         # save results
         return final
 
     def create_tiles(self, image, overlap=0.1):
-        """Divide an image into overlapping tiles and save them for debugging."""
-
-        height, width = image.shape[:2]
-        tile_size = max(640, min(height, width) // 2)
-        stride = int(tile_size * (1 - overlap))  # Calculate stride based on overlap
-        tiles = []
-        coordinates = []
-
-        # Generate and save tiles
-        tile_idx = 0
-        for y in range(0, height, stride):
-            for x in range(0, width, stride):
-                # Ensure tile doesn't exceed image boundaries
-                y_end = min(y + tile_size, height)
-                x_end = min(x + tile_size, width)
-                if (y_end - y) >= tile_size * 0.5 and (x_end - x) >= tile_size * 0.5:
-                    tile = image[y:y_end, x:x_end]
-                    # Pad tile to tile_size if smaller (e.g., at edges)
-                    if tile.shape[0] < tile_size or tile.shape[1] < tile_size:
-                        padded_tile = np.zeros((tile_size, tile_size, 3), dtype=np.uint8)
-                        padded_tile[:tile.shape[0], :tile.shape[1]] = tile
-                        tile = padded_tile
-                    tiles.append(tile)
-                    coordinates.append((x, y, x_end - x, y_end - y))  # Store (x, y, w, h)
-                    tile_idx += 1
-
-        return tiles, coordinates
+        """Divide an image into overlapping tiles using the cached tile plan for its resolution."""
+        return self.tile_planner.tiles(image, overlap)
 
     def merge_detections(self, detections, coordinates, image_shape, iou_threshold=0.3, conf_threshold=0.3):
-        """Merge YOLO detections from tiles using NMS."""
-        all_boxes = []
-        all_scores = []
-        all_classes = []
+        """Merge YOLO detections from tiles using class-aware batched NMS."""
+        tile_data = []
+        tile_offsets = []
+        counts = []
 
-        # Process detections from each tile
+        # Collect the raw (x1, y1, x2, y2, conf, cls) rows of every tile
         for tile_dets, (x_offset, y_offset, tile_w, tile_h) in zip(detections, coordinates):
-            if tile_dets is None:
+            if tile_dets is None or len(tile_dets) == 0:
                 continue
-            for det in tile_dets.boxes:
-                # Extract bounding box, confidence, and class
-                x1, y1, x2, y2 = det.xyxy[0].cpu().numpy()
-                score = det.conf[0].item()
-                cls = int(det.cls[0].cpu().numpy())
-
-                # Map coordinates back to original image
-                x1 = x1 + x_offset
-                y1 = y1 + y_offset
-                x2 = x2 + x_offset
-                y2 = y2 + y_offset
-
-                # Clip to image boundaries
-                x1 = max(0, min(x1, image_shape[1]))
-                x2 = max(0, min(x2, image_shape[1]))
-                y1 = max(0, min(y1, image_shape[0]))
-                y2 = max(0, min(y2, image_shape[0]))
-
-                if score >= conf_threshold:
-                    all_boxes.append([x1, y1, x2, y2])
-                    all_scores.append(score)
-                    all_classes.append(cls)
+            tile_data.append(tile_dets)
+            tile_offsets.append([x_offset, y_offset, x_offset, y_offset])
+            counts.append(len(tile_dets))
 
-        # Apply NMS to merged detections
-        if all_boxes and all_scores:
-            try:
-                boxes = torch.tensor(all_boxes, dtype=torch.float32)
-                scores = torch.tensor(all_scores, dtype=torch.float32)  # Ensure scalar values
-                classes = torch.tensor(all_classes, dtype=torch.int64)
-                indices = torch.ops.torchvision.nms(boxes, scores, iou_threshold)
-                return boxes[indices].numpy(), scores[indices].numpy(), classes[indices].numpy()
-            except Exception as e:
-                print(f"Error during NMS: {e}")
-                return np.array([]), np.array([]), np.array([])
-        else:
+        if not tile_data:
             print("No valid detections to merge")
             return np.array([]), np.array([]), np.array([])
 
-    def detect(self, image, conf_threshold=0.25, overlap=0.3):
+        data = torch.cat([d.cpu() for d in tile_data]).float()
+        offsets = torch.tensor(tile_offsets, dtype=torch.float32).repeat_interleave(torch.tensor(counts), dim=0)
+
+        # Map coordinates back to original image and clip to image boundaries
+        boxes = data[:, :4] + offsets
+        boxes[:, 0::2] = boxes[:, 0::2].clamp(0, image_shape[1])
+        boxes[:, 1::2] = boxes[:, 1::2].clamp(0, image_shape[0])
+        scores = data[:, 4]
+        classes = data[:, 5].long()
+
+        keep = scores >= conf_threshold
+        boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        if boxes.shape[0] == 0:
+            print("No valid detections to merge")
+            return np.array([]), np.array([]), np.array([])
+
+        # Apply NMS to merged detections
+        try:
+            indices = batched_nms(boxes, scores, classes, iou_threshold)
+            return boxes[indices].numpy(), scores[indices].numpy(), classes[indices].numpy()
+        except Exception as e:
+            print(f"Error during NMS: {e}")
+            return np.array([]), np.array([]), np.array([])
+
+    def predict_tiles(self, tiles, conf_threshold=0.25):
         """
-        执行目标检测
+        分批对分块执行推理
         Args:
-            image: 输入图像（OpenCV格式）
+            tiles: 分块图像列表
             conf_threshold: 置信度阈值
         Returns:
-            detections: 检测结果列表
+            detections: 与 tiles 一一对应的 (N, 6) 张量列表, 每行为 [x1, y1, x2, y2, score, class_id]
+        """
+        detections = []
+        for start in range(0, len(tiles), self.max_batch_size):
+            batch = tiles[start:start + self.max_batch_size]
+            with self.inference_lock:
+                if self.backend == 'onnx':
+                    detections.extend(torch.from_numpy(boxes)
+                                      for boxes in self.model.predict(batch, conf=conf_threshold))
+                else:
+                    results = self.model.predict(batch, device=self.device, conf=conf_threshold)
+                    detections.extend(result.boxes.data for result in results)
+        return detections
+
+    def skip_empty_tiles(self, image, tiles, coordinates):
+        """
+        丢弃SAM掩码后几乎全是背景的分块
+        Args:
+            image: 预处理后的图像（背景为黑色）
+            tiles: 分块图像列表
+            coordinates: 分块坐标列表
+        Returns:
+            tiles, coordinates: 保留下来的分块及其坐标
         """
+        if self.min_tile_occupancy <= 0 or not tiles:
+            return tiles, coordinates
+        occupancy = tile_occupancy(image, coordinates)
+        keep = [i for i, value in enumerate(occupancy) if value >= self.min_tile_occupancy]
+        return [tiles[i] for i in keep], [coordinates[i] for i in keep]
 
+    def prepare_tiles(self, image, overlap=0.3, stats=None):
+        """
+        分块并丢弃空分块
+        Returns:
+            tiles, coordinates: 需要推理的分块及其坐标
+        """
         # Create tiles and save them
         tiles, coordinates = self.create_tiles(image, overlap)
+        total_tiles = len(tiles)
 
-        # Run YOLO on each tile
-        detections = []
-        for tile in tiles:
-            if torch.cuda.is_available():
-                results = self.model.predict(tile, device="0", conf=conf_threshold)
-            else:
-                results = self.model.predict(tile, device="cpu", conf=conf_threshold)
-            detections.append(results[0] if results else None)
+        # Drop tiles that are (almost) entirely background
+        tiles, coordinates = self.skip_empty_tiles(image, tiles, coordinates)
+        if stats is not None:
+            stats['tiles_total'] = total_tiles
+            stats['tiles_skipped'] = total_tiles - len(tiles)
+        return tiles, coordinates
 
+    def build_detections(self, tile_detections, coordinates, image_shape):
+        """合并各分块的检测框并构建检测结果列表"""
         # Merge detections
-        boxes, scores, classes = self.merge_detections(detections, coordinates, image.shape, iou_threshold=0.4,
+        boxes, scores, classes = self.merge_detections(tile_detections, coordinates, image_shape, iou_threshold=0.4,
                                                        conf_threshold=0.3)
 
         # 构建检测结果
@@ -245,18 +320,40 @@ class YOLOv11Detector:
 
         return detections
 
-    def visualize(self, image, detections):
-        # """
-        # 可视化检测结果
-        # Args:
-        #     image: 输入图像
-        #     detections: 检测结果列表
-        # Returns:
-        #     annotated_image: 标注后的图像
-        # """
-        # # 使用YOLO的绘图函数
+    def detect(self, image, conf_threshold=0.25, overlap=0.3, stats=None):
+        """
+        执行目标检测
+        Args:
+            image: 输入图像（OpenCV格式）
+            conf_threshold: 置信度阈值
+            stats: 可选的字典, 用于返回分块数量、跳过的空分块数量和各阶段耗时
+        Returns:
+            detections: 检测结果列表
+        """
+        with timed(stats, 'tiling'):
+            tiles, coordinates = self.prepare_tiles(image, overlap, stats)
+
+        # Run YOLO on the tiles in batches of at most max_batch_size
+        with timed(stats, 'inference'):
+            tile_detections = self.predict_tiles(tiles, conf_threshold)
 
-        annotated_image = image.copy()
+        with timed(stats, 'nms'):
+            return self.build_detections(tile_detections, coordinates, image.shape)
+
+    def visualize(self, image, detections, inplace=False):
+        """
+        可视化检测结果
+        Args:
+            image: 输入图像
+            detections: 检测结果列表
+            inplace: 为 True 时直接在 image 上绘制
+        Returns:
+            annotated_image: 标注后的图像
+        """
+        if self.render_mode != 'builtin':
+            return self.renderer.render(image, detections, inplace=inplace)
+
+        annotated_image = image if inplace else image.copy()
 
         for det in detections:
             x1, y1, x2, y2 = det['bbox']
@@ -271,23 +368,69 @@ class YOLOv11Detector:
 
         return annotated_image
 
-    def process_image(self, image, conf_threshold=0.25):
+    def prepare(self, image, stats=None):
         """
-        处理图像：执行检测并可视化
+        去除背景、透视校正并分块（在提交请求的线程中执行, 多个请求的 SAM/ROI 和角点检测可以并行）
         Args:
             image: 输入图像（OpenCV格式）
-            conf_threshold: 置信度阈值
+            stats: 可选的统计字典
+        Returns:
+            inputs: 需要推理的分块列表, 交给 forward
+            context: (预处理后的图像, 分块坐标), 交给 finish
+        """
+        with timed(stats, 'preprocess'):
+            image = self.preprocess_image(image, stats=stats)  # Remove background using SAM / classical ROI
+        with timed(stats, 'tiling'):
+            tiles, coordinates = self.prepare_tiles(image, stats=stats)
+        return tiles, (image, coordinates)
+
+    def forward(self, inputs, conf_threshold=0.25):
+        """
+        对分块执行推理, 微批处理调度器把多个请求的分块合并后调用
+        Returns:
+            与 inputs 一一对应的 (N, 6) 张量列表
+        """
+        return self.predict_tiles(inputs, conf_threshold)
+
+    def finish(self, context, outputs, stats=None, annotate=True):
+        """
+        合并分块的检测结果并绘制（在提交请求的线程中执行）
+        Args:
+            context: prepare 返回的 context
+            outputs: forward 对该请求的分块返回的结果
+            annotate: 为 False 时不绘制, 返回预处理后的图像, 由调用方稍后调用 visualize
         Returns:
             detections: 检测结果列表
             annotated_image: 标注后的图像
         """
+        image, coordinates = context
+        with timed(stats, 'nms'):
+            detections = self.build_detections(outputs, coordinates, image.shape)
+        if not annotate:
+            return detections, image
+
+        # 可视化结果, 预处理后的图像不再使用, 直接在其上绘制
+        with timed(stats, 'render'):
+            annotated_image = self.visualize(image, detections, inplace=True)
 
-        image = self.preprocess_image(image)  # Remove background using SAM
+        return detections, annotated_image
 
-        # 执行检测
-        detections = self.detect(image, conf_threshold)
+    def process_image(self, image, conf_threshold=0.25, stats=None, annotate=True):
+        """
+        处理图像：执行检测并可视化
+        Args:
+            image: 输入图像（OpenCV格式）
+            conf_threshold: 置信度阈值
+            stats: 可选的字典, 用于返回分块和透视变换缓存的统计信息
+            annotate: 为 False 时不绘制, 返回预处理后的图像, 由调用方稍后调用 visualize
+        Returns:
+            detections: 检测结果列表
+            annotated_image: 标注后的图像
+        """
+        inputs, context = self.prepare(image, stats)
 
-        # 可视化结果
-        annotated_image = self.visualize(image, detections)
+        # Run YOLO on the tiles in batches of at most max_batch_size
+        with timed(stats, 'inference'):
+            outputs = self.forward(inputs, conf_threshold)
 
-        return detections, annotated_image
+        return self.finish(context, outputs, stats, annotate)
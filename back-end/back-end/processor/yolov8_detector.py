@@ -1,17 +1,50 @@
 # processor/yolov8_detector.py
+import threading
 import cv2
 import numpy as np
 from ultralytics import YOLO
+from processor.annotator import DetectionRenderer
+from config import RENDER_CONFIG, INFERENCE_CONFIG
+from utils.timing import timed
 
 class YOLOv8Detector:
-    def __init__(self, model_path):
+    def __init__(self, model_path, renderer=None, backend=None):
         """
         初始化YOLOv8检测器
         Args:
             model_path: 模型权重文件路径
+            renderer: 'fast' 使用共享的 DetectionRenderer, 'builtin' 使用 results.plot(), 默认取 RENDER_CONFIG
+            backend: 'ultralytics' 或 'onnx', 默认取 INFERENCE_CONFIG
         """
-        self.model = YOLO(model_path)
+        self.backend = backend or INFERENCE_CONFIG['backend']
+        if self.backend == 'onnx':
+            from processor.onnx_backend import OnnxYOLO, onnx_path_for
+            self.model = OnnxYOLO(onnx_path_for(model_path),
+                                  intra_op_threads=INFERENCE_CONFIG.get('onnx_intra_op_threads', 0),
+                                  inter_op_threads=INFERENCE_CONFIG.get('onnx_inter_op_threads', 0))
+        else:
+            self.model = YOLO(model_path)
         self.classes = ['crazing', 'inclusion', 'patches', 'pitted_surface', 'rolled-in_scale', 'scratches']
+        self.render_mode = renderer or RENDER_CONFIG['renderer']
+        self.renderer = DetectionRenderer(self.classes)
+        # ultralytics 的 predictor 保存每次调用的状态, 不能被多个线程同时调用
+        self.inference_lock = threading.Lock()
+
+    def predict_boxes(self, image, conf_threshold=0.25):
+        """
+        执行一次推理
+        Args:
+            image: 输入图像
+            conf_threshold: 置信度阈值
+        Returns:
+            boxes: (N, 6) 的 [x1, y1, x2, y2, score, class_id]
+            results: ultralytics 的 Results, ONNX 后端为 None
+        """
+        with self.inference_lock:
+            if self.backend == 'onnx':
+                return self.model.predict([image], conf=conf_threshold)[0], None
+            results = self.model(image, conf=conf_threshold)[0]
+        return results.boxes.data.cpu().numpy(), results
 
     def detect(self, image, conf_threshold=0.25):
         """
@@ -23,12 +56,11 @@ class YOLOv8Detector:
             detections: 检测结果列表
         """
         # 使用YOLO模型进行推理
-        results = self.model(image, conf=conf_threshold)[0]
+        boxes, _ = self.predict_boxes(image, conf_threshold)
         
         # 构建检测结果
         detections = []
-        boxes = results.boxes.data.tolist()
-        for box in boxes:
+        for box in boxes.tolist():
             x1, y1, x2, y2, score, class_id = box
             class_name = self.classes[int(class_id)]
             detections.append({
@@ -55,11 +87,15 @@ class YOLOv8Detector:
         # # 使用YOLO的绘图函数
 
         """
-        使用YOLOv8的内置绘图函数来可视化图像。
-        注意：此方法依赖于模型的结果，因此忽略外部detections。
+        使用已有的检测结果绘制标注图, 不再次调用模型。
+        render_mode 为 'builtin' 时使用YOLOv8的内置绘图函数（会重新推理, 忽略外部detections）。
         """
+        if self.render_mode != 'builtin' or self.backend == 'onnx':
+            return self.renderer.render(image, detections)
+
         image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.model(image_rgb)
+        with self.inference_lock:
+            results = self.model(image_rgb)
         annotated_rgb = results[0].plot()
         annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
         return annotated_bgr
@@ -84,12 +120,14 @@ class YOLOv8Detector:
 
         # return annotated_image
 
-    def process_image(self, image, conf_threshold=0.25):
+    def process_image(self, image, conf_threshold=0.25, stats=None, annotate=True):
         """
         处理图像：执行检测并可视化
         Args:
             image: 输入图像（OpenCV格式）
             conf_threshold: 置信度阈值
+            stats: 与 YOLOv11Detector 接口保持一致, YOLOv8 不做分块, 只记录推理和绘制耗时
+            annotate: 为 False 时不绘制, 返回原图, 由调用方稍后调用 visualize
         Returns:
             detections: 检测结果列表
             annotated_image: 标注后的图像
@@ -101,16 +139,54 @@ class YOLOv8Detector:
         # annotated_image = self.visualize(image, detections)
         
         # return detections, annotated_image
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with timed(stats, 'inference'):
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+            # YOLO 推理（只用一次）, NMS 在 ultralytics 内部完成
+            boxes, results = self.predict_boxes(image_rgb, conf_threshold)
+        return self._build_outputs(image, boxes, results, annotate, stats)
 
-        # YOLO 推理（只用一次）
-        results = self.model(image_rgb, conf=conf_threshold)
+    def prepare(self, image, stats=None):
+        """
+        转换为 RGB（在提交请求的线程中执行）
+        Returns:
+            inputs: [RGB 图像], 交给 forward
+            context: 原图, 交给 finish
+        """
+        with timed(stats, 'preprocess'):
+            image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        return [image_rgb], image
+
+    def forward(self, inputs, conf_threshold=0.25):
+        """
+        一次前向传播处理多张 RGB 图像, 微批处理调度器把多个请求的图像合并后调用
+        Returns:
+            与 inputs 一一对应的 (boxes, results) 列表, ONNX 后端的 results 为 None
+        """
+        with self.inference_lock:
+            if self.backend == 'onnx':
+                return [(boxes, None) for boxes in self.model.predict(inputs, conf=conf_threshold)]
+            return [(results.boxes.data.cpu().numpy(), results)
+                    for results in self.model(inputs, conf=conf_threshold)]
+
+    def finish(self, context, outputs, stats=None, annotate=True):
+        """
+        构建检测结果并绘制（在提交请求的线程中执行）
+        Args:
+            context: prepare 返回的原图
+            outputs: forward 对该请求返回的 [(boxes, results)]
+            annotate: 为 False 时不绘制, 返回原图
+        """
+        boxes, results = outputs[0]
+        return self._build_outputs(context, boxes, results, annotate, stats)
+
+    def _build_outputs(self, image, boxes, results, annotate=True, stats=None):
+        """由推理结果构建检测结果列表和标注图"""
         detections = []
-        boxes = results[0].boxes
-        for box, conf, cls in zip(boxes.xyxy, boxes.conf, boxes.cls):
-            x1, y1, x2, y2 = map(int, box.tolist())
-            score = float(conf)
-            class_id = int(cls)
+        for box in boxes.tolist():
+            x1, y1, x2, y2 = map(int, box[:4])
+            score = float(box[4])
+            class_id = int(box[5])
             class_name = self.classes[class_id]
             detections.append({
                 'class': class_name,
@@ -122,7 +198,13 @@ class YOLOv8Detector:
                 }
             })
 
-        annotated_rgb = results[0].plot()
-        annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
+        if not annotate:
+            return detections, image
+        with timed(stats, 'render'):
+            if self.render_mode == 'builtin' and results is not None:
+                annotated_rgb = results.plot()
+                annotated_bgr = cv2.cvtColor(annotated_rgb, cv2.COLOR_RGB2BGR)
+            else:
+                annotated_bgr = self.renderer.render(image, detections)
 
         return detections, annotated_bgr
@@ -0,0 +1,176 @@
+"""
+生产环境服务入口（pre-fork）
+
+父进程导入 app 并等待预热完成（模型权重已加载, ultralytics 的 Conv+BN 融合已在首次推理时完成）,
+然后 fork 工作进程。推理只读取权重, 权重所在的内存页在各工作进程之间写时复制共享,
+每个工作进程只额外占用自己的 Python 对象和推理时的中间结果。
+
+注意:
+    - 只有 MODEL_REGISTRY_CONFIG['preload'] 中的版本在 fork 前加载; 其他版本在各工作进程中首次使用时各自加载
+    - ROI_CONFIG['mode'] 为 'sam' 时, SAM ViT-H（约 2.5 GB, 最大的模型）总是在 fork 前加载, 不论 SAM_CONFIG['preload'];
+      工作进程中不按 SAM_CONFIG['idle_timeout'] 卸载（卸载后重新加载会变成每个进程独占的一份）
+    - 任务状态表在各工作进程的内存中, 查询请求可能落到其他工作进程;
+      多工作进程时任务状态同时写入 JOB_CONFIG['state_dir'], 其他进程从中读取（SSE 每 0.5 秒读取一次）
+    - /metrics 的直方图按进程记录, 多工作进程时写入 SERVER_CONFIG['metrics_dir'], 响应时合并全部工作进程的数据
+    - 存储清理线程（STORAGE_CONFIG['gc_enabled']）在各工作进程处理第一个请求时启动, 父进程中不启动
+    - CUDA 在 fork 之后不可用, GPU 环境请使用 --workers 0
+    - ONNX Runtime 的 InferenceSession 自带线程池, fork 之后在子进程中 run 可能卡住;
+      使用 onnx 后端的版本在 fork 前卸载, 各工作进程首次使用时自己加载（不共享内存）
+    - 对比单独启动多个进程的内存占用见 tools/measure_worker_memory.py
+    - 工作进程收到 SIGTERM/SIGINT 后先写完后台批量写入队列中的检测记录再退出
+
+用法:
+    python serve.py                       # SERVER_CONFIG 中的 host/port/workers
+    python serve.py --workers 4 --port 5003
+    python serve.py --workers 0           # 单进程, 不 fork
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from werkzeug.serving import make_server
+
+from config import SERVER_CONFIG, ROI_CONFIG, JOB_CONFIG
+
+
+def create_socket(host, port, backlog=128):
+    """在父进程中创建监听套接字, 所有工作进程共用"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def unload_onnx(detectors):
+    """
+    卸载使用 onnx 后端的检测器（预热时已在父进程中创建了 InferenceSession）
+    Returns:
+        卸载的版本名列表
+    """
+    versions = [version for version, detector in detectors.loaded().items()
+                if getattr(detector, 'backend', None) == 'onnx']
+    for version in versions:
+        detectors.unload(version)
+    return versions
+
+
+def _exit_on_signal(signum, frame):
+    # 抛出 SystemExit 而不是直接终止, finally 和 atexit 中的清理（写完检测记录）得以执行
+    raise SystemExit(0)
+
+
+class PreforkServer:
+    def __init__(self, app, sock, workers, on_exit=None):
+        """
+        Args:
+            app: Flask 应用（模型已在当前进程中加载）
+            sock: 监听套接字
+            workers: 工作进程数
+            on_exit: 工作进程退出前调用的函数; 工作进程用 os._exit 退出, 不会执行 atexit
+        """
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.on_exit = on_exit
+        self.children = set()
+        self.stopping = False
+
+    def _serve(self):
+        """工作进程: 在共享的套接字上处理请求, 每个请求一个线程"""
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+        signal.signal(signal.SIGINT, _exit_on_signal)
+        host, port = self.sock.getsockname()[:2]
+        server = make_server(host, port, self.app, threaded=True, fd=self.sock.fileno())
+        print(f"worker {os.getpid()} serving on http://{host}:{port}")
+        server.serve_forever()
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self._serve()
+            finally:
+                try:
+                    if self.on_exit is not None:
+                        self.on_exit()
+                finally:
+                    os._exit(0)
+        self.children.add(pid)
+        return pid
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # 冻结 fork 前的对象, 避免子进程的垃圾回收写入这些对象所在的内存页
+        gc.collect()
+        gc.freeze()
+        for _ in range(self.workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"worker {pid} exited with status {status}, restarting")
+                time.sleep(1)
+                self.spawn()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=SERVER_CONFIG.get('host', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=SERVER_CONFIG.get('port', 5003))
+    parser.add_argument('--workers', type=int, default=SERVER_CONFIG.get('workers', 4))
+    args = parser.parse_args()
+
+    import torch
+    if args.workers > 0 and torch.cuda.is_available():
+        sys.exit('CUDA cannot be used in forked workers, run with --workers 0')
+
+    import app as server
+    sock = create_socket(args.host, args.port, SERVER_CONFIG.get('backlog', 128))
+
+    # fork 之前必须完成模型加载和预热, 并且不能有正在运行的后台线程
+    server.warmup.join()
+    if args.workers > 0 and ROI_CONFIG.get('mode') == 'sam':
+        server.get_sam_holder().pin()
+    if args.workers > 0:
+        server.job_manager.share_state(JOB_CONFIG.get('state_dir', './jobs'))
+        server.metrics.share(SERVER_CONFIG.get('metrics_dir', './metrics'))
+        # InferenceSession 随检测器释放（PreforkServer.run 在 fork 前 gc.collect）, 其线程池随之结束
+        unloaded = unload_onnx(server.detectors)
+        if unloaded:
+            print(f"onnx models unloaded before fork, each worker loads its own: {unloaded}")
+    print(f"models loaded: {[v for v, s in server.detectors.stats()['versions'].items() if s['loaded']]}, "
+          f"SAM loaded: {server.get_sam_holder().loaded}")
+
+    on_exit = server.record_writer.close if server.record_writer is not None else None
+    if args.workers <= 0:
+        signal.signal(signal.SIGTERM, _exit_on_signal)
+        make_server(args.host, args.port, server.app, threaded=True, fd=sock.fileno()).serve_forever()
+        return
+    PreforkServer(server.app, sock, args.workers, on_exit).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+历史记录查询在合成数据 (默认 100 万行) 上的耗时: 迁移前 vs 迁移后
+
+迁移前: 与旧 detection_record 相同, user_id 上只有外键自动创建的单列索引
+迁移后: models/migrations.py 第 3 个迁移添加的 (user_id, created_at) 复合索引
+
+测量 get_records_by_user_paginated 的两条查询 (COUNT(*) 和 ORDER BY created_at DESC LIMIT/OFFSET),
+分别针对记录最多的用户和普通用户, 并打印第一页查询的 EXPLAIN。
+最后测量建索引后 get_records_by_user_after 的游标分页在同一深度的耗时 (不需要 OFFSET 和 COUNT(*))。
+数据写入 MYSQL_CONFIG 数据库中单独的 detection_record_bench 表, 默认结束后删除。
+
+用法:
+    python tools/benchmark_history_query.py
+    python tools/benchmark_history_query.py --rows 200000 --users 500 --keep
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from models.db import get_pool  # noqa: E402
+from models.migrations import add_user_created_index  # noqa: E402
+
+TABLE = 'detection_record_bench'
+CLASSES = ['crazing', 'inclusion', 'patches', 'pitted_surface', 'rolled-in_scale', 'scratches']
+
+
+def create_table(cursor):
+    cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    cursor.execute(f"""
+    CREATE TABLE {TABLE} (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        user_id INT NOT NULL,
+        original_image_url TEXT,
+        detected_image_url TEXT,
+        detection_data JSON,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        model_version VARCHAR(10),
+        total_defects INT NOT NULL DEFAULT 0,
+        defect_types JSON,
+        KEY user_id (user_id)
+    )
+    """)
+
+
+def fill(rows, users, heavy_share, batch_size=5000):
+    """按时间顺序插入, heavy_share 比例的记录属于用户 1, 其余随机分给其他用户"""
+    rng = random.Random(0)
+    start = datetime.now() - timedelta(days=365)
+    step = timedelta(days=365) / rows
+    sql = f"""
+    INSERT INTO {TABLE} (user_id, original_image_url, detected_image_url, detection_data, created_at,
+                         model_version, total_defects, defect_types)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    begin = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, rows)):
+            user_id = 1 if rng.random() < heavy_share else rng.randint(2, users)
+            detections = [{'class': rng.choice(CLASSES), 'confidence': round(rng.random(), 3),
+                           'bbox': [10, 10, 60, 60]} for _ in range(rng.randint(0, 3))]
+            name = f'{i:064x}.jpg'
+            batch.append((user_id, f'http://127.0.0.1:5003/tmp/ct/{name}', f'http://127.0.0.1:5003/tmp/draw/{name}',
+                          json.dumps(detections), start + step * i, 'YOLOv11', len(detections),
+                          json.dumps(sorted({d['class'] for d in detections}))))
+        with get_pool().cursor() as cursor:
+            cursor.executemany(sql, batch)
+        print(f"\rinserted {min(offset + batch_size, rows)}/{rows}", end='', flush=True)
+    print(f"\ninsert: {time.perf_counter() - begin:.1f}s")
+
+
+def time_query(sql, args, repeat):
+    times = []
+    with get_pool().cursor() as cursor:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(sql, args)
+            cursor.fetchall()
+            times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2] * 1000
+
+
+def measure(label, user_ids, per_page, deep_page, repeat):
+    count_sql = f"SELECT COUNT(*) AS total FROM {TABLE} WHERE user_id = %s"
+    page_sql = f"SELECT * FROM {TABLE} WHERE user_id = %s ORDER BY created_at DESC LIMIT %s OFFSET %s"
+    results = {}
+    for name, user_id in user_ids.items():
+        results[name] = {
+            'count': time_query(count_sql, (user_id,), repeat),
+            'page 1': time_query(page_sql, (user_id, per_page, 0), repeat),
+            f'page {deep_page}': time_query(page_sql, (user_id, per_page, (deep_page - 1) * per_page), repeat)
+        }
+        timings = ', '.join(f'{query} {ms:8.2f} ms' for query, ms in results[name].items())
+        print(f"{label:7s} {name:13s}: {timings}")
+
+    with get_pool().cursor() as cursor:
+        cursor.execute('EXPLAIN ' + page_sql, (user_ids['heaviest user'], per_page, 0))
+        for row in cursor.fetchall():
+            print(f"        EXPLAIN: type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}")
+    return results
+
+
+def measure_keyset(user_ids, per_page, deep_page, repeat):
+    """游标分页: 取第 deep_page 页最后一行之前的 per_page 行"""
+    keyset_sql = f"""
+    SELECT * FROM {TABLE}
+    WHERE user_id = %s AND (created_at < %s OR (created_at = %s AND id < %s))
+    ORDER BY created_at DESC, id DESC LIMIT %s
+    """
+    for name, user_id in user_ids.items():
+        with get_pool().cursor() as cursor:
+            cursor.execute(
+                f"SELECT created_at, id FROM {TABLE} WHERE user_id = %s "
+                f"ORDER BY created_at DESC, id DESC LIMIT 1 OFFSET %s",
+                (user_id, (deep_page - 1) * per_page - 1)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            print(f"keyset  {name:13s}: fewer than {deep_page} pages")
+            continue
+        args = (user_id, row['created_at'], row['created_at'], row['id'], per_page)
+        print(f"keyset  {name:13s}: page {deep_page} {time_query(keyset_sql, args, repeat):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--heavy-share', type=float, default=0.1, help='记录最多的用户所占的比例')
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--deep-page', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help='保留合成数据表')
+    args = parser.parse_args()
+
+    with get_pool().cursor() as cursor:
+        create_table(cursor)
+    try:
+        fill(args.rows, args.users, args.heavy_share)
+        with get_pool().cursor() as cursor:
+            cursor.execute(f"ANALYZE TABLE {TABLE}")
+            cursor.fetchall()
+        user_ids = {'heaviest user': 1, 'typical user': 2}
+
+        before = measure('before', user_ids, args.per_page, args.deep_page, args.repeat)
+        start = time.perf_counter()
+        with get_pool().cursor() as cursor:
+            add_user_created_index(cursor, TABLE)
+            cursor.execute(f"ANALYZE TABLE {TABLE}")
+            cursor.fetchall()
+        print(f"create index: {time.perf_counter() - start:.1f}s")
+        after = measure('after', user_ids, args.per_page, args.deep_page, args.repeat)
+
+        measure_keyset(user_ids, args.per_page, args.deep_page, args.repeat)
+
+        for name in user_ids:
+            speedups = ', '.join(f'{query} x{before[name][query] / max(after[name][query], 1e-6):.1f}'
+                                 for query in before[name])
+            print(f"speedup {name:13s}: {speedups}")
+    finally:
+        if not args.keep:
+            with get_pool().cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+if __name__ == '__main__':
+    main()
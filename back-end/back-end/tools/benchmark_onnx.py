@@ -0,0 +1,118 @@
+"""
+ONNX Runtime 后端与 PyTorch(ultralytics) 后端的一致性检查和 CPU 延迟对比
+
+先导出 ONNX:  yolo export model=weights/best.pt format=onnx
+用法:
+    python tools/benchmark_onnx.py --detector yolov11 --weights weights/best.pt --images dataset/image/train
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from config import INFERENCE_CONFIG  # noqa: E402
+from processor.yolov8_detector import YOLOv8Detector  # noqa: E402
+from processor.yolov11_detector import YOLOv11Detector  # noqa: E402
+
+
+def box_iou(a, b):
+    w = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match(reference, candidate, iou_threshold):
+    """按类别和IoU贪心匹配, 返回 (匹配数, 最大置信度差)"""
+    used = set()
+    matched, max_conf_diff = 0, 0.0
+    for ref in sorted(reference, key=lambda d: -d['confidence']):
+        best, best_iou = None, iou_threshold
+        for i, det in enumerate(candidate):
+            if i in used or det['class'] != ref['class']:
+                continue
+            iou = box_iou(ref['bbox'], det['bbox'])
+            if iou >= best_iou:
+                best, best_iou = i, iou
+        if best is not None:
+            used.add(best)
+            matched += 1
+            max_conf_diff = max(max_conf_diff, abs(ref['confidence'] - candidate[best]['confidence']))
+    return matched, max_conf_diff
+
+
+def timed_detect(detector, image, conf):
+    start = time.perf_counter()
+    detections = detector.detect(image, conf)
+    return detections, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--detector', choices=['yolov8', 'yolov11'], default='yolov11')
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--images', default='dataset/image/train')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.9, help='判定为同一检测框的IoU阈值')
+    parser.add_argument('--min-recall', type=float, default=0.95, help='一致性检查通过所需的匹配比例')
+    parser.add_argument('--threads', type=int, default=0, help='ONNX Runtime intra-op 线程数')
+    args = parser.parse_args()
+
+    INFERENCE_CONFIG['onnx_intra_op_threads'] = args.threads
+    detector_cls = YOLOv8Detector if args.detector == 'yolov8' else YOLOv11Detector
+    torch_detector = detector_cls(args.weights, backend='ultralytics')
+    onnx_detector = detector_cls(args.weights, backend='onnx')
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    paths = paths[:args.limit]
+    if not paths:
+        print("No images found")
+        return 1
+
+    # 预热
+    warmup = cv2.imread(str(paths[0]))
+    timed_detect(torch_detector, warmup, args.conf)
+    timed_detect(onnx_detector, warmup, args.conf)
+
+    total_ref = total_onnx = total_matched = 0
+    max_conf_diff = 0.0
+    torch_times, onnx_times = [], []
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        ref, torch_time = timed_detect(torch_detector, image, args.conf)
+        cand, onnx_time = timed_detect(onnx_detector, image, args.conf)
+        matched, conf_diff = match(ref, cand, args.iou)
+
+        total_ref += len(ref)
+        total_onnx += len(cand)
+        total_matched += matched
+        max_conf_diff = max(max_conf_diff, conf_diff)
+        torch_times.append(torch_time)
+        onnx_times.append(onnx_time)
+
+    recall = total_matched / total_ref if total_ref else 1.0
+    precision = total_matched / total_onnx if total_onnx else 1.0
+    print(f"{len(torch_times)} images, {total_ref} PyTorch detections, {total_onnx} ONNX detections")
+    print(f"parity: recall {recall:.3f}, precision {precision:.3f}, max confidence diff {max_conf_diff:.4f}")
+    print(f"PyTorch latency: mean {np.mean(torch_times) * 1000:.1f} ms, p95 {np.percentile(torch_times, 95) * 1000:.1f} ms")
+    print(f"ONNX    latency: mean {np.mean(onnx_times) * 1000:.1f} ms, p95 {np.percentile(onnx_times, 95) * 1000:.1f} ms")
+    print(f"speedup: x{np.mean(torch_times) / np.mean(onnx_times):.2f}")
+
+    if recall < args.min_recall or precision < args.min_recall:
+        print("PARITY CHECK FAILED")
+        return 1
+    print("parity check passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+YOLOv11 分块推理基准测试: 逐块推理 vs 分批推理 (CPU)
+
+用法:
+    python tools/benchmark_tiles.py --weights weights/best.pt --image dataset/image/train/scratches_10.jpg
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processor.yolov11_detector import YOLOv11Detector  # noqa: E402
+
+
+def run_sequential(detector, tiles, conf_threshold):
+    for tile in tiles:
+        detector.model.predict(tile, device='cpu', conf=conf_threshold, verbose=False)
+
+
+def run_batched(detector, tiles, conf_threshold, batch_size):
+    for start in range(0, len(tiles), batch_size):
+        detector.model.predict(tiles[start:start + batch_size], device='cpu', conf=conf_threshold, verbose=False)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--image', required=True, help='测试图像, 例如 1920x1080 的相机图像')
+    parser.add_argument('--batch-sizes', default='1,2,4,8,16')
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--conf', type=float, default=0.25)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        raise ValueError(f"无法读取图像: {args.image}")
+
+    detector = YOLOv11Detector(args.weights)
+    tiles, _ = detector.create_tiles(image, args.overlap)
+    print(f"image {image.shape[1]}x{image.shape[0]} -> {len(tiles)} tiles of {tiles[0].shape[0]}px")
+
+    # 预热, 排除首次推理的初始化开销
+    run_batched(detector, tiles, args.conf, len(tiles))
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        run_sequential(detector, tiles, args.conf)
+    baseline = (time.perf_counter() - start) / args.repeat
+    print(f"sequential       : {len(tiles) / baseline:8.2f} tiles/s ({baseline * 1000:.1f} ms/image)")
+
+    for batch_size in [int(b) for b in args.batch_sizes.split(',')]:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            run_batched(detector, tiles, args.conf, batch_size)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        print(f"batch_size={batch_size:<6d}: {len(tiles) / elapsed:8.2f} tiles/s "
+              f"({elapsed * 1000:.1f} ms/image, x{baseline / elapsed:.2f})")
+
+
+if __name__ == '__main__':
+    main()
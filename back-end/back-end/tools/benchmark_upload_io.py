@@ -0,0 +1,80 @@
+"""
+/upload 上传文件处理的延迟对比:
+    旧: file.save -> shutil.copy -> cv2.imread
+    新: cv2.imdecode(内存数据) + 后台写入与硬链接
+
+用法:
+    python tools/benchmark_upload_io.py                  # 生成 1920x1080 的合成 JPEG
+    python tools/benchmark_upload_io.py --image capture.jpg
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from utils.storage import BackgroundWriter  # noqa: E402
+
+
+def old_path(data, upload_dir, ct_dir, name):
+    src_path = os.path.join(upload_dir, name)
+    with open(src_path, 'wb') as f:
+        f.write(data)
+    tmp_ct_path = os.path.join(ct_dir, name)
+    shutil.copy(src_path, tmp_ct_path)
+    return cv2.imread(tmp_ct_path)
+
+
+def new_path(data, upload_dir, ct_dir, name, writer):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    writer.submit(data, os.path.join(upload_dir, name), [os.path.join(ct_dir, name)])
+    return img
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--image', help='JPEG 文件, 默认生成 1920x1080 的合成图像')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, 'rb') as f:
+            data = f.read()
+    else:
+        rng = np.random.default_rng(0)
+        frame = cv2.GaussianBlur(rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8), (7, 7), 0)
+        data = cv2.imencode('.jpg', frame)[1].tobytes()
+    print(f"payload: {len(data) / 1024:.0f} KB")
+
+    with tempfile.TemporaryDirectory() as root:
+        upload_dir, ct_dir = os.path.join(root, 'uploads'), os.path.join(root, 'ct')
+        os.makedirs(upload_dir)
+        os.makedirs(ct_dir)
+        writer = BackgroundWriter()
+
+        old_times, new_times = [], []
+        for i in range(args.repeat):
+            start = time.perf_counter()
+            old_path(data, upload_dir, ct_dir, f'old_{i}.jpg')
+            old_times.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            new_path(data, upload_dir, ct_dir, f'new_{i}.jpg', writer)
+            new_times.append(time.perf_counter() - start)
+        writer.shutdown()
+
+    old_ms, new_ms = np.median(old_times) * 1000, np.median(new_times) * 1000
+    print(f"save + copy + imread : {old_ms:.2f} ms (median)")
+    print(f"imdecode + background: {new_ms:.2f} ms (median)")
+    print(f"saved per request    : {old_ms - new_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+检查 YOLOv11Detector.merge_detections（张量实现）与原来的逐框循环输出一致
+
+在合成的分块检测结果上分别运行两种实现, 比较合并后的框、置信度和类别。
+合成数据包含: 空分块和 None、超出图像边界需要裁剪的框（边缘分块的填充区域）、
+低于置信度阈值的框以及相互重叠需要 NMS 的框。
+原实现的 NMS 不区分类别, 新实现按类别做 NMS, 两者只在单类别模型（YOLOv11 只有 scratches）上相同,
+因此默认只生成一个类别。
+
+用法:
+    python tools/check_merge_detections.py
+    python tools/check_merge_detections.py --cases 500 --width 2600 --height 1500
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processor.tile_planner import TilePlan  # noqa: E402
+from processor.yolov11_detector import YOLOv11Detector  # noqa: E402
+
+
+def merge_reference(detections, coordinates, image_shape, iou_threshold=0.3, conf_threshold=0.3):
+    """user-003 之前的逐框实现, 输入改为每个分块的 (N, 6) 张量, 计算过程不变"""
+    all_boxes = []
+    all_scores = []
+    all_classes = []
+
+    for tile_dets, (x_offset, y_offset, tile_w, tile_h) in zip(detections, coordinates):
+        if tile_dets is None:
+            continue
+        for det in tile_dets:
+            x1, y1, x2, y2 = det[:4].cpu().numpy()
+            score = det[4].item()
+            cls = int(det[5].cpu().numpy())
+
+            x1 = x1 + x_offset
+            y1 = y1 + y_offset
+            x2 = x2 + x_offset
+            y2 = y2 + y_offset
+
+            x1 = max(0, min(x1, image_shape[1]))
+            x2 = max(0, min(x2, image_shape[1]))
+            y1 = max(0, min(y1, image_shape[0]))
+            y2 = max(0, min(y2, image_shape[0]))
+
+            if score >= conf_threshold:
+                all_boxes.append([x1, y1, x2, y2])
+                all_scores.append(score)
+                all_classes.append(cls)
+
+    if not all_boxes:
+        return np.array([]), np.array([]), np.array([])
+    boxes = torch.tensor(all_boxes, dtype=torch.float32)
+    scores = torch.tensor(all_scores, dtype=torch.float32)
+    classes = torch.tensor(all_classes, dtype=torch.int64)
+    indices = torch.ops.torchvision.nms(boxes, scores, iou_threshold)
+    return boxes[indices].numpy(), scores[indices].numpy(), classes[indices].numpy()
+
+
+def synthetic_tiles(rng, plan, num_classes, max_boxes):
+    """
+    每个分块随机生成 (N, 6) 检测结果, 坐标相对分块左上角, 可以超出分块和图像边界
+    框较大且分块之间有重叠, 相邻分块的框经常相交, NMS 会去掉其中一部分
+    """
+    detections = []
+    for x, y, w, h in plan.coordinates:
+        choice = rng.random()
+        if choice < 0.1:
+            detections.append(None)
+            continue
+        n = 0 if choice < 0.2 else int(rng.integers(1, max_boxes + 1))
+        x1 = rng.uniform(-20, plan.tile_size, n)
+        y1 = rng.uniform(-20, plan.tile_size, n)
+        # 一部分框延伸到边缘分块的填充区域之外, 合并时需要裁剪到图像边界
+        x2 = x1 + rng.uniform(5, plan.tile_size * 0.6, n)
+        y2 = y1 + rng.uniform(5, plan.tile_size * 0.6, n)
+        scores = rng.uniform(0.0, 1.0, n)  # 约 30% 低于默认阈值 0.3
+        classes = rng.integers(0, num_classes, n)
+        rows = np.stack([x1, y1, x2, y2, scores, classes], axis=1) if n else np.zeros((0, 6))
+        detections.append(torch.from_numpy(rows.astype(np.float32)))
+    return detections
+
+
+def check_case(detector, rng, height, width, overlap, num_classes, max_boxes):
+    plan = TilePlan(height, width, overlap)
+    detections = synthetic_tiles(rng, plan, num_classes, max_boxes)
+    image_shape = (height, width, 3)
+
+    expected = merge_reference(detections, plan.coordinates, image_shape, iou_threshold=0.4, conf_threshold=0.3)
+    actual = detector.merge_detections(detections, plan.coordinates, image_shape, iou_threshold=0.4,
+                                       conf_threshold=0.3)
+    for name, e, a in zip(('boxes', 'scores', 'classes'), expected, actual):
+        assert e.shape == a.shape, f"{name} shape {a.shape} != {e.shape}"
+        assert np.array_equal(e, a), f"{name} differ:\nexpected {e}\nactual   {a}"
+    return len(expected[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', type=int, default=200)
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--overlap', type=float, default=0.3)
+    parser.add_argument('--classes', type=int, default=1, help='类别数, 大于 1 时 NMS 的差异是预期的')
+    parser.add_argument('--max-boxes', type=int, default=8, help='每个分块最多的框数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    # merge_detections 不使用模型, 跳过 __init__ 中的模型加载
+    detector = object.__new__(YOLOv11Detector)
+    rng = np.random.default_rng(args.seed)
+    kept = 0
+    for case in range(args.cases):
+        # 尺寸每次略有变化, 与透视校正后的钢板图像一样
+        height = args.height + int(rng.integers(-100, 101))
+        width = args.width + int(rng.integers(-100, 101))
+        try:
+            kept += check_case(detector, rng, height, width, args.overlap, args.classes, args.max_boxes)
+        except AssertionError as e:
+            sys.exit(f"case {case} ({width}x{height}) mismatch: {e}")
+    print(f"{args.cases} cases identical, {kept} boxes kept after NMS")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+比较 SAM 与传统OpenCV 两种钢板区域提取方式: 掩码一致性（IoU）、角点偏差以及端到端耗时
+
+用法:
+    python tools/compare_roi.py --images dataset/image/train --limit 50
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processor.roi import mask_iou  # noqa: E402
+from processor.yolov11_detector import YOLOv11Detector  # noqa: E402
+
+
+def run_mode(detector, image, mode):
+    """返回 (掩码, 角点, 预处理耗时, 端到端耗时)"""
+    start = time.perf_counter()
+    mask = detector.segment_plate(image, mode)
+    masked = np.where(mask[..., np.newaxis], image, 0).astype(image.dtype, copy=False)
+    corners = detector.find_plate_corners(masked)
+    homography, size = detector.compute_homography(corners)
+    warped = cv2.warpPerspective(masked, homography, size, flags=cv2.INTER_LINEAR)
+    preprocess_time = time.perf_counter() - start
+    detector.detect(warped)
+    total_time = time.perf_counter() - start
+    return mask, corners, preprocess_time, total_time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', default='weights/best.pt')
+    parser.add_argument('--images', default='dataset/image/train')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    paths = paths[:args.limit]
+    detector = YOLOv11Detector(args.weights)
+
+    # 预热: 加载SAM并初始化推理
+    if paths:
+        warmup = cv2.imread(str(paths[0]))
+        run_mode(detector, warmup, 'sam')
+        run_mode(detector, warmup, 'classical')
+
+    ious, corner_errors = [], []
+    timings = {'sam': [[], []], 'classical': [[], []]}
+    for path in paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        sam_mask, sam_corners, sam_pre, sam_total = run_mode(detector, image, 'sam')
+        cls_mask, cls_corners, cls_pre, cls_total = run_mode(detector, image, 'classical')
+
+        iou = mask_iou(sam_mask, cls_mask)
+        corner_error = float(np.linalg.norm(np.float32(sam_corners) - np.float32(cls_corners), axis=1).max())
+        ious.append(iou)
+        corner_errors.append(corner_error)
+        timings['sam'][0].append(sam_pre)
+        timings['sam'][1].append(sam_total)
+        timings['classical'][0].append(cls_pre)
+        timings['classical'][1].append(cls_total)
+        print(f"{path.name}: IoU={iou:.3f} max corner offset={corner_error:.1f}px "
+              f"sam={sam_total * 1000:.0f}ms classical={cls_total * 1000:.0f}ms")
+
+    if not ious:
+        print("No images found")
+        return
+
+    print(f"\n{len(ious)} images")
+    print(f"mask IoU            : mean {np.mean(ious):.3f}, min {np.min(ious):.3f}")
+    print(f"max corner offset   : mean {np.mean(corner_errors):.1f}px, p95 {np.percentile(corner_errors, 95):.1f}px")
+    for mode, (pre, total) in timings.items():
+        print(f"{mode:<10s} preprocess: {np.mean(pre) * 1000:8.1f} ms, end-to-end: {np.mean(total) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+多工作进程的内存占用对比:
+    naive  : 启动 N 个独立进程 (serve.py --workers 0), 每个进程各自加载全部模型
+    prefork: serve.py --workers N, 父进程加载模型后 fork, 权重写时复制共享
+
+两种方式都包含 SAM ViT-H（ROI_CONFIG['mode'] 为 'sam' 时, 约 2.5 GB, 节省的内存主要来自它）:
+naive 的每个进程在预热 YOLOv11 时加载, prefork 的父进程在 fork 前加载。
+每种方式都会打印 SAM 是否已加载; 显示 no 时（如关闭了预热）两者的对比不包含 SAM。
+
+统计每个工作进程的 USS (Private_Clean + Private_Dirty, 进程独占的内存) 和 PSS,
+以及所有进程的 PSS 总和（即这组进程实际占用的物理内存）。只支持 Linux (/proc/<pid>/smaps_rollup)。
+
+用法:
+    python tools/measure_worker_memory.py --workers 4
+    python tools/measure_worker_memory.py --workers 4 --port 5100 --timeout 600
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from utils.auth import generate_token  # noqa: E402
+
+
+def memory_kb(pid):
+    """
+    Returns:
+        {'rss', 'pss', 'uss'} 单位 KB
+    """
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':') and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        'rss': fields.get('Rss', 0),
+        'pss': fields.get('Pss', 0),
+        'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+
+def children_of(parent_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # 第 4 个字段是 ppid, 进程名中可能有空格, 从最后一个 ')' 之后开始解析
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def wait_ready(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/ready', timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(1)
+    raise TimeoutError(f'server on port {port} not ready after {timeout}s')
+
+
+def sam_loaded(port):
+    # 统计接口需要登录, 用服务端同一个 JWT_SECRET_KEY 签发令牌
+    request = urllib.request.Request(f'http://127.0.0.1:{port}/api/sam/stats',
+                                     headers={'Authorization': f'Bearer {generate_token(0)}'})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)['sam']['loaded']
+
+
+def start(args_list):
+    return subprocess.Popen([sys.executable, str(ROOT / 'serve.py'), *args_list], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def report(mode, workers, parent=None, sam=None):
+    rows = [memory_kb(pid) for pid in workers]
+    total_pss = sum(r['pss'] for r in rows)
+    if parent is not None:
+        total_pss += memory_kb(parent)['pss']
+    avg = {key: sum(r[key] for r in rows) / len(rows) / 1024 for key in ('rss', 'pss', 'uss')}
+    print(f"{mode:8s} workers={len(rows)}  per-worker RSS {avg['rss']:7.0f} MB  PSS {avg['pss']:7.0f} MB  "
+          f"USS {avg['uss']:7.0f} MB  | total PSS {total_pss / 1024:7.0f} MB  | SAM loaded: {sam}")
+    return avg['uss'], total_pss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--timeout', type=int, default=600, help='等待模型加载和预热的秒数')
+    args = parser.parse_args()
+
+    # naive: 每个进程独立加载模型
+    processes = [start(['--workers', '0', '--port', str(args.port + i)]) for i in range(args.workers)]
+    try:
+        for i in range(args.workers):
+            wait_ready(args.port + i, args.timeout)
+        sam = 'yes' if all(sam_loaded(args.port + i) for i in range(args.workers)) else 'no'
+        naive_uss, naive_total = report('naive', [p.pid for p in processes], sam=sam)
+    finally:
+        for p in processes:
+            p.terminate()
+            p.wait()
+
+    # prefork: 父进程加载一次, 工作进程共享
+    parent = start(['--workers', str(args.workers), '--port', str(args.port)])
+    try:
+        wait_ready(args.port, args.timeout)
+        deadline = time.time() + 30
+        while len(children_of(parent.pid)) < args.workers and time.time() < deadline:
+            time.sleep(0.5)
+        sam = 'yes' if sam_loaded(args.port) else 'no'
+        prefork_uss, prefork_total = report('prefork', children_of(parent.pid), parent=parent.pid, sam=sam)
+    finally:
+        parent.terminate()
+        parent.wait()
+
+    print(f"per-worker USS saved: {naive_uss - prefork_uss:.0f} MB, "
+          f"total memory saved: {naive_total - prefork_total:.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
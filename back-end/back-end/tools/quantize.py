@@ -0,0 +1,211 @@
+"""
+NEU 缺陷检测模型的 INT8 训练后量化（静态校准）
+
+流程: best.pt -> best.onnx (FP32) -> best.int8.onnx (INT8, 用 dataset/image/train 校准),
+然后在验证集上用 utils.metrics.ap_per_class 计算 mAP, 并对比 FP32 / INT8 的 CPU 延迟。
+生成的 .int8.onnx 可在 config.MODEL_VERSIONS 中注册为模型版本 (backend='onnx')。
+
+用法:
+    python tools/quantize.py --weights dataset/runs/detect/neu_defect_yolov84/weights/best.pt
+    python tools/quantize.py --weights weights/best.pt --calib-size 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import onnx
+import yaml
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                      quantize_static)
+from onnxruntime.quantization.shape_inference import quant_pre_process
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processor.onnx_backend import OnnxYOLO, onnx_path_for  # noqa: E402
+from utils.metrics import ap_per_class  # noqa: E402
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp')
+# Decoding ops of the Detect head stay in float, quantizing them costs accuracy for little speed
+HEAD_FLOAT_OPS = {'Concat', 'Split', 'Sigmoid', 'Softmax', 'Mul', 'Add', 'Sub', 'Div', 'Reshape', 'Transpose',
+                  'Slice'}
+
+
+def int8_path_for(model_path):
+    root, _ = os.path.splitext(onnx_path_for(model_path))
+    return root + '.int8.onnx'
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    def __init__(self, model, image_paths):
+        self.model = model
+        self.image_paths = list(image_paths)
+        self.index = 0
+
+    def get_next(self):
+        while self.index < len(self.image_paths):
+            image = cv2.imread(str(self.image_paths[self.index]))
+            self.index += 1
+            if image is not None:
+                blob, _, _ = self.model.preprocess(image)
+                return {self.model.input_name: blob[None]}
+        return None
+
+
+def head_nodes(model_path):
+    """返回检测头（最后一个 /model.N/ 模块）中保持浮点的节点名"""
+    graph = onnx.load(model_path).graph
+    indices = [int(n.name.split('/model.')[1].split('/')[0]) for n in graph.node
+               if n.name.startswith('/model.') and n.name.split('/model.')[1].split('/')[0].isdigit()]
+    if not indices:
+        return []
+    prefix = f'/model.{max(indices)}/'
+    return [n.name for n in graph.node if n.name.startswith(prefix) and n.op_type in HEAD_FLOAT_OPS]
+
+
+def export_onnx(weights, imgsz):
+    path = onnx_path_for(weights)
+    if not os.path.exists(path):
+        from ultralytics import YOLO
+        YOLO(weights).export(format='onnx', imgsz=imgsz)
+    return path
+
+
+def quantize(fp32_path, int8_path, calib_paths):
+    prep_path = fp32_path.replace('.onnx', '.prep.onnx')
+    quant_pre_process(fp32_path, prep_path)
+
+    reader = ImageCalibrationReader(OnnxYOLO(fp32_path), calib_paths)
+    quantize_static(prep_path, int8_path, reader,
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                    calibrate_method=CalibrationMethod.MinMax,
+                    nodes_to_exclude=head_nodes(prep_path))
+    os.remove(prep_path)
+
+    # 保留 ultralytics 写入的 names 等元数据, OnnxYOLO 依赖它得到类别名
+    fp32_model = onnx.load(fp32_path)
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+
+
+def load_labels(label_path, image_shape, class_map):
+    """YOLO 格式标签 -> (M, 5) 的 [class, x1, y1, x2, y2]（像素坐标, 类别映射到模型的类别id）"""
+    height, width = image_shape[:2]
+    labels = []
+    if os.path.exists(label_path):
+        with open(label_path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) != 5 or int(parts[0]) not in class_map:
+                    continue
+                cx, cy, w, h = (float(v) for v in parts[1:])
+                labels.append([class_map[int(parts[0])], (cx - w / 2) * width, (cy - h / 2) * height,
+                               (cx + w / 2) * width, (cy + h / 2) * height])
+    return np.array(labels, dtype=np.float32).reshape(-1, 5)
+
+
+def box_iou(boxes_a, boxes_b):
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    lt = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    rb = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=2)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_predictions(pred, labels, iouv):
+    """每个预测框在各个IoU阈值下是否为TP, 返回 (N, len(iouv)) 布尔矩阵"""
+    correct = np.zeros((len(pred), len(iouv)), dtype=bool)
+    if len(pred) == 0 or len(labels) == 0:
+        return correct
+    iou = box_iou(labels[:, 1:], pred[:, :4])
+    correct_class = labels[:, 0:1] == pred[:, 5]
+    for i, threshold in enumerate(iouv):
+        x = np.nonzero((iou >= threshold) & correct_class)
+        if x[0].shape[0]:
+            matches = np.concatenate((np.stack(x, 1), iou[x[0], x[1]][:, None]), 1)
+            if x[0].shape[0] > 1:
+                matches = matches[matches[:, 2].argsort()[::-1]]
+                matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+                matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+            correct[matches[:, 1].astype(int), i] = True
+    return correct
+
+
+def evaluate(model, image_paths, label_dir, dataset_names, conf=0.001):
+    """返回 (mAP@0.5, mAP@0.5:0.95, 平均延迟秒)"""
+    model_ids = {name: i for i, name in model.names.items()}
+    class_map = {i: model_ids[name] for i, name in enumerate(dataset_names) if name in model_ids}
+    iouv = np.linspace(0.5, 0.95, 10)
+
+    stats, times = [], []
+    for path in image_paths:
+        image = cv2.imread(str(path))
+        if image is None:
+            continue
+        labels = load_labels(os.path.join(label_dir, path.stem + '.txt'), image.shape, class_map)
+
+        start = time.perf_counter()
+        pred = model.predict([image], conf=conf)[0]
+        times.append(time.perf_counter() - start)
+
+        stats.append((match_predictions(pred, labels, iouv), pred[:, 4], pred[:, 5], labels[:, 0]))
+
+    if not stats:
+        return 0.0, 0.0, 0.0
+    tp, scores, pred_cls, target_cls = (np.concatenate(x, 0) for x in zip(*stats))
+    if len(tp) == 0 or len(target_cls) == 0:
+        return 0.0, 0.0, float(np.mean(times))
+    _, _, ap, _, _ = ap_per_class(tp, scores, pred_cls, target_cls)
+    return float(ap[:, 0].mean()), float(ap.mean()), float(np.mean(times))
+
+
+def list_images(directory):
+    return sorted(p for p in Path(directory).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', default='weights/best.pt', help='.pt 或已导出的 .onnx')
+    parser.add_argument('--data', default='dataset/dataset.yaml')
+    parser.add_argument('--calib-dir', default='dataset/image/train')
+    parser.add_argument('--calib-size', type=int, default=300, help='用于校准的训练图像数量')
+    parser.add_argument('--val-dir', default='dataset/image/val')
+    parser.add_argument('--label-dir', default='dataset/labels/val')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--threads', type=int, default=0, help='ONNX Runtime intra-op 线程数')
+    args = parser.parse_args()
+
+    with open(args.data, encoding='utf-8') as f:
+        dataset_names = yaml.safe_load(f)['names']
+
+    fp32_path = export_onnx(args.weights, args.imgsz)
+    int8_path = int8_path_for(args.weights)
+
+    calib_paths = list_images(args.calib_dir)
+    random.Random(0).shuffle(calib_paths)
+    start = time.perf_counter()
+    quantize(fp32_path, int8_path, calib_paths[:args.calib_size])
+    print(f"quantized {fp32_path} -> {int8_path} with {min(len(calib_paths), args.calib_size)} calibration images "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    val_paths = list_images(args.val_dir)
+    print(f"\n{'model':<8s}{'size MB':>10s}{'mAP@0.5':>10s}{'mAP@.5:.95':>12s}{'latency ms':>12s}")
+    for name, path in (('FP32', fp32_path), ('INT8', int8_path)):
+        model = OnnxYOLO(path, intra_op_threads=args.threads)
+        map50, map50_95, latency = evaluate(model, val_paths, args.label_dir, dataset_names)
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{name:<8s}{size:>10.1f}{map50:>10.3f}{map50_95:>12.3f}{latency * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
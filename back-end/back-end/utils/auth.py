@@ -11,10 +11,20 @@ def generate_token(user_id):
     }
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
 
-def token_required(f):
+def token_required(f=None, allow_query_token=False):
+    """
+    Args:
+        allow_query_token: 允许通过 ?token= 传递令牌, 只用于 EventSource 无法设置请求头的 SSE 接口
+                           （查询字符串会出现在访问日志和 Referer 中）, 用法 @token_required(allow_query_token=True)
+    """
+    if f is None:
+        return lambda f: token_required(f, allow_query_token)
+
     @wraps(f)
     def decorated(*args, **kwargs):
         token = request.headers.get('Authorization')
+        if not token and allow_query_token and request.args.get('token'):
+            token = 'Bearer ' + request.args.get('token')
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         try:
@@ -24,4 +34,4 @@ def token_required(f):
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
         return f(current_user_id, *args, **kwargs)
-    return decorated 
\ No newline at end of file
+    return decorated
@@ -0,0 +1,295 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+try:
+    import fcntl
+except ImportError:  # Windows: 只能单进程运行, 线程锁已经足够
+    fcntl = None
+
+from utils.storage import link_or_copy
+
+CONTENT_NAME = re.compile(r'^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$')
+
+
+def is_content_name(filename):
+    """文件名是否为内容寻址的 <sha256>.<ext>"""
+    return bool(CONTENT_NAME.match(os.path.basename(filename)))
+
+
+def content_name(data, ext):
+    return hashlib.sha256(data).hexdigest() + ext.lower()
+
+
+class ContentStore:
+    def __init__(self, writer, upload_dir='./uploads', work_dir='./tmp/ct', draw_dir='./tmp/draw',
+                 derived_dirs=('./tmp/thumb', './tmp/rendition')):
+        """
+        按图像内容的 SHA-256 命名存储上传的原图和标注图: 相同内容只存一份, 原图与工作副本之间使用硬链接
+        Args:
+            writer: BackgroundWriter, 原图在后台写入
+            upload_dir: 原图目录
+            work_dir: 原图的工作副本目录（/tmp/ct, 与原图硬链接）
+            draw_dir: 标注图目录
+            derived_dirs: 由标注图生成的缩略图等目录, 文件名与标注图同名（扩展名可以不同）
+        """
+        self.writer = writer
+        self.upload_dir = upload_dir
+        self.work_dir = work_dir
+        self.draw_dir = draw_dir
+        self.derived_dirs = list(derived_dirs)
+        self._lock = threading.Lock()
+        # 复用已有文件与垃圾回收删除文件互斥, 见 _names_locked
+        self._names_lock = threading.Lock()
+        self._lock_fd = None
+        self._lock_pid = None
+        self._gc_thread = None
+        self._gc_pid = None
+        self._usage = None
+        self._usage_at = 0.0
+
+        self.writes = 0
+        self.dedupe_hits = 0
+        self.dedupe_bytes = 0
+        self.gc_runs = 0
+        self.gc_removed = 0
+        self.gc_freed = 0
+        self.gc_last_run = None
+        self.gc_last_duration = None
+        self.gc_error = None
+
+    def _count(self, deduped, size):
+        with self._lock:
+            if deduped:
+                self.dedupe_hits += 1
+                self.dedupe_bytes += size
+            else:
+                self.writes += 1
+
+    @contextmanager
+    def _names_locked(self):
+        """
+        保护 "文件已存在 -> 复用并更新修改时间" 与垃圾回收的 "检查 -> 删除" 之间的竞争:
+        否则回收可能删除刚被复用的文件, 或在 utime 之前删除导致上传失败
+        线程锁用于同一进程内, flock 用于 pre-fork 的多个工作进程之间
+        """
+        with self._names_lock:
+            if fcntl is None:
+                yield
+                return
+            if self._lock_pid != os.getpid():
+                # flock 属于打开的文件, fork 继承的描述符与父进程共用同一把锁, 子进程需要重新打开
+                if self._lock_fd is not None:
+                    os.close(self._lock_fd)
+                os.makedirs(self.work_dir, exist_ok=True)
+                self._lock_fd = os.open(os.path.join(self.work_dir, '.store.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                self._lock_pid = os.getpid()
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def put_original(self, data, ext):
+        """
+        保存上传的原图: 新内容在后台写入 upload_dir 并硬链接到 work_dir, 已存在的内容直接复用
+        Returns:
+            文件名 <sha256>.<ext>
+        """
+        filename = content_name(data, ext)
+        src_path = os.path.join(self.upload_dir, filename)
+        work_path = os.path.join(self.work_dir, filename)
+        with self._names_locked():
+            deduped = self.writer.pending(src_path) or os.path.exists(src_path)
+            if not deduped:
+                self.writer.submit(data, src_path, [work_path])
+            elif not self.writer.pending(src_path):
+                if not os.path.exists(work_path):
+                    link_or_copy(src_path, work_path)
+                # 更新修改时间, 保留期清理不会删除刚被再次上传的文件
+                os.utime(src_path)
+        self._count(deduped, len(data))
+        return filename
+
+    def put_image(self, image, ext, params=()):
+        """
+        编码并保存标注图, 相同内容只写一次
+        Returns:
+            文件名 <sha256>.<ext>
+        """
+        ok, encoded = cv2.imencode(ext, image, list(params))
+        if not ok:
+            raise ValueError(f"Encode failed: {ext}")
+        data = encoded.tobytes()
+        filename = content_name(data, ext)
+        path = os.path.join(self.draw_dir, filename)
+        with self._names_locked():
+            deduped = os.path.exists(path)
+            if deduped:
+                os.utime(path)
+        if deduped:
+            self._count(True, len(data))
+            return filename
+        # 新写入的文件修改时间是当前时间, 不会被回收, 写入时不需要持有锁
+        # 先写临时文件再改名, 并发写入相同内容时读者不会看到不完整的文件
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._count(False, len(data))
+        return filename
+
+    def _scan(self):
+        """返回 [(目录, 文件名, stat)], 只包含内容寻址的文件"""
+        entries = []
+        for directory in [self.upload_dir, self.work_dir, self.draw_dir] + self.derived_dirs:
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.is_file() and is_content_name(entry.name):
+                        entries.append((directory, entry.name, entry.stat()))
+        return entries
+
+    def collect_garbage(self, referenced, min_age=3600):
+        """
+        删除不再被检测记录引用的文件
+        Args:
+            referenced: 检测记录中引用的文件名集合
+            min_age: 只删除修改时间早于该秒数的文件, 避免删除刚上传、还未写入记录的文件
+        Returns:
+            (删除的文件数, 释放的字节数)
+        """
+        start = time.time()
+        referenced_stems = {os.path.splitext(name)[0] for name in referenced}
+        removed, freed = 0, 0
+        for directory, name, _ in self._scan():
+            path = os.path.join(directory, name)
+            if directory in self.derived_dirs:
+                # 缩略图等与标注图同名, 扩展名可能不同
+                in_use = os.path.splitext(name)[0] in referenced_stems
+            else:
+                in_use = name in referenced
+            if in_use:
+                continue
+            with self._names_locked():
+                try:
+                    # 重新读取: 扫描之后文件可能被再次上传 (更新了修改时间) 或已删除硬链接的另一个名字
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                if start - st.st_mtime < min_age or self.writer.pending(path):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"GC remove {path} failed: {str(e)}")
+                    continue
+            removed += 1
+            # 硬链接的最后一个名字被删除时才真正释放空间
+            if st.st_nlink <= 1:
+                freed += st.st_size
+
+        with self._lock:
+            self.gc_runs += 1
+            self.gc_removed += removed
+            self.gc_freed += freed
+            self.gc_last_run = start
+            self.gc_last_duration = round(time.time() - start, 3)
+        print(f"storage GC removed {removed} files, freed {freed / 1024 / 1024:.1f} MB")
+        return removed, freed
+
+    def _claim_gc_run(self, interval):
+        """
+        多个工作进程各有一个清理线程, 通过 .gc-stamp 的修改时间协调:
+        距上一次清理（任一进程）不到 interval / 2 时跳过, 每个间隔大约只有一个进程扫描
+        """
+        stamp = os.path.join(self.work_dir, '.gc-stamp')
+        with self._names_locked():
+            try:
+                if time.time() - os.stat(stamp).st_mtime < interval / 2:
+                    return False
+            except OSError:
+                pass
+            with open(stamp, 'a'):
+                pass
+            os.utime(stamp)
+        return True
+
+    def start_gc(self, load_referenced, interval=3600, min_age=3600):
+        """
+        启动后台保留期清理线程
+        每个进程第一次调用时启动, 之后的调用没有影响; 应在处理请求时调用而不是在导入时:
+        pre-fork 的父进程在 fork 之前不能有后台线程（线程可能正持有连接池等的锁）
+        Args:
+            load_referenced: 返回检测记录引用的文件名集合的函数
+            interval: 清理间隔秒数
+            min_age: 见 collect_garbage
+        """
+        if self._gc_pid == os.getpid():
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self._claim_gc_run(interval):
+                        self.collect_garbage(load_referenced(), min_age)
+                    self.gc_error = None
+                except Exception as e:
+                    print(f"Storage GC error: {str(e)}")
+                    self.gc_error = str(e)
+
+        with self._lock:
+            if self._gc_pid == os.getpid():
+                return
+            self._gc_pid = os.getpid()
+            self._gc_thread = threading.Thread(target=loop, name='storage-gc', daemon=True)
+            self._gc_thread.start()
+
+    def usage(self):
+        """各目录的文件数和占用空间, 硬链接的文件只计算一次"""
+        seen = set()
+        directories = {}
+        total = 0
+        for directory, _, st in self._scan():
+            usage = directories.setdefault(directory, {'files': 0, 'bytes': 0})
+            usage['files'] += 1
+            usage['bytes'] += st.st_size
+            if (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                total += st.st_size
+        return {'directories': directories, 'total_bytes': total}
+
+    def stats(self, usage_max_age=60):
+        """
+        Args:
+            usage_max_age: usage() 要遍历并 stat 所有文件, 结果缓存这么多秒, 频繁请求统计时不重复扫描
+        """
+        with self._lock:
+            usage, usage_at = self._usage, self._usage_at
+        if usage is None or time.time() - usage_at >= usage_max_age:
+            usage = self.usage()
+            with self._lock:
+                self._usage, self._usage_at = usage, time.time()
+        with self._lock:
+            return {
+                'usage': usage,
+                'writes': self.writes,
+                'dedupe_hits': self.dedupe_hits,
+                'dedupe_saved_bytes': self.dedupe_bytes,
+                'gc': {
+                    'running': self._gc_pid == os.getpid(),
+                    'runs': self.gc_runs,
+                    'removed_files': self.gc_removed,
+                    'freed_bytes': self.gc_freed,
+                    'last_run': self.gc_last_run,
+                    'last_duration': self.gc_last_duration,
+                    'error': self.gc_error
+                }
+            }
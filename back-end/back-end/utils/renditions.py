@@ -0,0 +1,103 @@
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+import cv2
+
+from config import RENDITION_CONFIG
+from utils.content_store import is_content_name
+from utils.storage import BackgroundWriter, write_image
+
+THUMB_DIR = './tmp/thumb'
+RENDITION_DIR = './tmp/rendition'
+
+QUALITY_FLAGS = {
+    'jpg': cv2.IMWRITE_JPEG_QUALITY,
+    'jpeg': cv2.IMWRITE_JPEG_QUALITY,
+    'webp': cv2.IMWRITE_WEBP_QUALITY
+}
+
+
+def encode_params(fmt, quality):
+    flag = QUALITY_FLAGS.get(fmt)
+    return [flag, int(quality)] if flag is not None else []
+
+
+def thumbnail_path(filename):
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(THUMB_DIR, f"{stem}.{RENDITION_CONFIG.get('thumbnail_format', 'jpg')}")
+
+
+def rendition_path(filename, fmt):
+    return os.path.join(RENDITION_DIR, f"{os.path.splitext(filename)[0]}.{fmt}")
+
+
+def _derived_url(detected_url, path):
+    """
+    由标注图 URL 得到缩略图等派生文件的 URL
+    派生文件只为内容寻址的标注图生成, 与标注图同名, 内容不会变化
+    """
+    if not RENDITION_CONFIG.get('enabled') or not detected_url:
+        return None
+    parts = urlsplit(detected_url)
+    if not is_content_name(parts.path):
+        return None
+    return urlunsplit((parts.scheme, parts.netloc, '/' + os.path.relpath(path, '.').replace(os.sep, '/'), '', ''))
+
+
+def thumbnail_url(detected_url):
+    filename = os.path.basename(urlsplit(detected_url or '').path)
+    return _derived_url(detected_url, thumbnail_path(filename))
+
+
+def rendition_urls(detected_url):
+    filename = os.path.basename(urlsplit(detected_url or '').path)
+    return {fmt: _derived_url(detected_url, rendition_path(filename, fmt))
+            for fmt in RENDITION_CONFIG.get('formats', {})}
+
+
+def _generate(image, filename):
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    os.makedirs(RENDITION_DIR, exist_ok=True)
+    height, width = image.shape[:2]
+    size = RENDITION_CONFIG.get('thumbnail_size', 320)
+    scale = size / max(height, width)
+    thumbnail = image
+    if scale < 1:
+        thumbnail = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+    thumbnail_format = RENDITION_CONFIG.get('thumbnail_format', 'jpg')
+    write_image(thumbnail_path(filename), thumbnail,
+                encode_params(thumbnail_format, RENDITION_CONFIG.get('thumbnail_quality', 75)))
+
+    for fmt, quality in RENDITION_CONFIG.get('formats', {}).items():
+        write_image(rendition_path(filename, fmt), image, encode_params(fmt, quality))
+
+
+class RenditionWriter:
+    def __init__(self, max_workers=2):
+        """
+        在后台线程池中为标注图生成缩略图和压缩版本
+        Args:
+            max_workers: 编码线程数
+        """
+        self.writer = BackgroundWriter(max_workers=max_workers)
+
+    def submit(self, image, filename):
+        """
+        Args:
+            image: 标注图, 提交后调用方不能再修改
+            filename: 标注图文件名
+        Returns:
+            concurrent.futures.Future, 未启用时返回 None
+        """
+        if not RENDITION_CONFIG.get('enabled'):
+            return None
+        paths = [thumbnail_path(filename)]
+        paths += [rendition_path(filename, fmt) for fmt in RENDITION_CONFIG.get('formats', {})]
+        return self.writer.run(_generate, paths, image, filename)
+
+    def wait(self, path, timeout=10):
+        self.writer.wait(path, timeout)
+
+
+rendition_writer = RenditionWriter(max_workers=RENDITION_CONFIG.get('workers', 2))
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+
+def link_or_copy(src_path, dst_path):
+    """用硬链接代替复制, 跨文件系统等无法建立硬链接时退回到复制"""
+    if os.path.abspath(src_path) == os.path.abspath(dst_path):
+        return
+    if os.path.exists(dst_path):
+        os.remove(dst_path)
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copy(src_path, dst_path)
+
+
+def content_hash(data, length=16):
+    """文件内容的 SHA-256 前缀, 用作 URL 中的版本号"""
+    return hashlib.sha256(data).hexdigest()[:length]
+
+
+def write_image(path, image, params=()):
+    """
+    按 path 的扩展名编码并写入图像（代替 cv2.imwrite, 编码结果同时用于计算内容哈希）
+    Args:
+        params: cv2.imencode 的编码参数, 如 [cv2.IMWRITE_JPEG_QUALITY, 85]
+    Returns:
+        内容哈希
+    """
+    ok, encoded = cv2.imencode(os.path.splitext(path)[1], image, list(params))
+    if not ok:
+        raise ValueError(f"Encode failed: {path}")
+    data = encoded.tobytes()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return content_hash(data)
+
+
+class BackgroundWriter:
+    def __init__(self, max_workers=2):
+        """
+        在后台线程中落盘, 把文件写入移出请求的关键路径
+        Args:
+            max_workers: 写文件的线程数
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='writer')
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def _write(self, data, path, link_paths):
+        with open(path, 'wb') as f:
+            f.write(data)
+        for link_path in link_paths:
+            link_or_copy(path, link_path)
+
+    def _done(self, paths, future):
+        with self._lock:
+            for path in paths:
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+        if future.exception() is not None:
+            print(f"Background write error: {future.exception()}")
+
+    def submit(self, data, path, link_paths=()):
+        """
+        异步写入 data 到 path, 并为 link_paths 建立硬链接
+        Returns:
+            concurrent.futures.Future
+        """
+        return self.run(self._write, [path, *link_paths], data, path, list(link_paths))
+
+    def run(self, fn, paths, *args):
+        """
+        在写线程中执行 fn(*args), 完成之前 wait(paths 中的路径) 会阻塞
+        Returns:
+            concurrent.futures.Future
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        future = self._executor.submit(fn, *args)
+        with self._lock:
+            for p in paths:
+                self._pending[p] = future
+        future.add_done_callback(lambda f: self._done(paths, f))
+        return future
+
+    def pending(self, path):
+        """path 是否有尚未完成的写入"""
+        with self._lock:
+            return os.path.abspath(path) in self._pending
+
+    def wait(self, path, timeout=10):
+        """等待 path 上尚未完成的写入, 读取刚上传的文件前调用"""
+        with self._lock:
+            future = self._pending.get(os.path.abspath(path))
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+background_writer = BackgroundWriter()
@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 秒, 覆盖从编码/写库的毫秒级到 SAM 分割的数秒级
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+@contextmanager
+def timed(stats, stage):
+    """
+    记录代码块的耗时到 stats['timings'][stage]（毫秒, 同一阶段多次执行时累加）
+    Args:
+        stats: 请求的统计字典, 为 None 时不记录
+        stage: 阶段名
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            add_timing(stats, stage, time.perf_counter() - start)
+
+
+def add_timing(stats, stage, seconds):
+    timings = stats.setdefault('timings', {})
+    timings[stage] = round(timings.get(stage, 0.0) + seconds * 1000, 3)
+
+
+def server_timing(timings):
+    """{阶段: 毫秒} -> Server-Timing 响应头"""
+    return ', '.join(f'{stage};dur={ms:.1f}' for stage, ms in timings.items())
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Prometheus 格式的直方图（累计桶 + _sum + _count）
+        Args:
+            name: 指标名
+            documentation: HELP 文本
+            label_names: 标签名
+            buckets: 桶的上界（秒）, 自动追加 +Inf
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值 -> [各桶计数, sum, count]
+
+    def observe(self, seconds, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[0][i] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def snapshot(self):
+        """当前各序列的数据, 可以 JSON 序列化: [[标签值, 各桶计数, sum, count], ...]"""
+        with self._lock:
+            return [[list(label_values), list(counts), total, count]
+                    for label_values, (counts, total, count) in self._series.items()]
+
+    def render(self, snapshots=None):
+        """
+        Args:
+            snapshots: 多个进程的 snapshot(), 给出时输出它们的合计, 否则输出本进程的数据
+        """
+        if snapshots is None:
+            snapshots = [self.snapshot()]
+        merged = {}
+        for snapshot in snapshots:
+            for label_values, counts, total, count in snapshot:
+                series = merged.setdefault(tuple(label_values), [[0] * len(self.buckets), 0.0, 0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += total
+                series[2] += count
+
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for label_values, (counts, total, count) in sorted(merged.items()):
+            labels = _format_labels(self.label_names, label_values)
+            prefix = labels + ',' if labels else ''
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            suffix = f'{{{labels}}}' if labels else ''
+            lines.append(f'{self.name}_sum{suffix} {total}')
+            lines.append(f'{self.name}_count{suffix} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self._flush_lock = threading.Lock()
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def share(self, directory):
+        """
+        多进程模式（与 prometheus_client 的 multiprocess 模式相同的做法）:
+        各进程把自己的数据写入 directory/<pid>.json, render 合并目录中全部进程的数据。
+        pre-fork 时 /metrics 请求可能落到任一工作进程, 只输出本进程的数据会让计数在不相关的序列之间跳动。
+        已退出的工作进程的文件保留, 合计值不会因为工作进程重启而减少。serve.py 在 fork 之前调用, 并清空上次运行的文件
+        """
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        self.directory = directory
+
+    def flush(self):
+        """多进程模式下写入本进程的数据, 否则不做任何事"""
+        if self.directory is None:
+            return
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        # 串行写入: 并发时较旧的快照不会覆盖较新的
+        with self._flush_lock:
+            snapshot = {metric.name: metric.snapshot() for metric in self._metrics}
+            with open(path + '.tmp', 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(path + '.tmp', path)
+
+    def _load_snapshots(self):
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        """Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        if self.directory is None:
+            return ''.join(metric.render() for metric in self._metrics)
+        self.flush()
+        snapshots = self._load_snapshots()
+        return ''.join(metric.render([s.get(metric.name, []) for s in snapshots]) for metric in self._metrics)
+
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    'defect_stage_duration_seconds',
+    'Duration of each /upload processing stage',
+    ('stage', 'model_version')
+)
+request_seconds = metrics.histogram(
+    'defect_request_duration_seconds',
+    'Total /upload processing time, from receiving the file to the record insert',
+    ('model_version',)
+)
+
+
+def observe_request(timings, model_version, total_seconds):
+    """把一个请求的各阶段耗时（毫秒）记入直方图"""
+    for stage, ms in timings.items():
+        stage_seconds.observe(ms / 1000, stage, model_version)
+    request_seconds.observe(total_seconds, model_version)
+    metrics.flush()